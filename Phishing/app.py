@@ -1,8 +1,16 @@
 import streamlit as st
-import machine_learning as ml
+from contextlib import nullcontext
+import datasets
 import feature_extraction as fe
-from bs4 import BeautifulSoup
+import feature_registry as fr
+import fetcher
+import model_store as ms
+import cascade
+import verdict_cache as vc
+import feature_cache as fc
+import instrumentation as inst
 import requests
+import pandas as pd
 import matplotlib.pyplot as plt
 
 st.title("Phishing Website Detection using Machine Learning")
@@ -35,9 +43,18 @@ st.write(
     "Dataset created in October 2022."
 )
 
+# ----- Data (sólo CSVs; los modelos se cargan ya entrenados) ----- #
+@st.cache_data
+def load_data():
+    legitimate_df, phishing_df = datasets.load_datasets()
+    df, _, _ = datasets.prepare_data(legitimate_df, phishing_df)
+    return legitimate_df, phishing_df, df
+
+legitimate_df, phishing_df, df = load_data()
+
 # ----- PIE CHART ----- #
 labels = ['Phishing', 'Legitimate']
-phishing_rate = int(ml.phishing_df.shape[0] / (ml.phishing_df.shape[0] + ml.legitimate_df.shape[0]) * 100)
+phishing_rate = int(phishing_df.shape[0] / (phishing_df.shape[0] + legitimate_df.shape[0]) * 100)
 legitimate_rate = 100 - phishing_rate
 sizes = [phishing_rate, legitimate_rate]
 explode = (0.1, 0)
@@ -50,13 +67,13 @@ st.pyplot(fig)
 st.write("Features + URL + Label => DataFrame")
 st.markdown("label = 1 for phishing, 0 for legitimate")
 number = st.slider("Select number of rows to display", 0, 100)
-st.dataframe(ml.legitimate_df.head(number))
+st.dataframe(legitimate_df.head(number))
 
-@st.cache
+@st.cache_data
 def convert_df(df):
     return df.to_csv().encode('utf-8')
 
-csv = convert_df(ml.df)
+csv = convert_df(df)
 st.download_button(
     label="Download data as CSV",
     data=csv,
@@ -69,7 +86,11 @@ st.write("Only content-based features are used. URL-based features like length a
 
 st.subheader("Results")
 st.write("7 ML classifiers tested with k-fold cross-validation. Confusion matrices, accuracy, precision, recall calculated.")
-st.table(ml.df_results)
+df_results = ms.cv_results()
+if df_results.empty:
+    st.info("No trained models found. Run `python machine_learning.py` to train and save them.")
+else:
+    st.table(df_results)
 
 st.write("NB -> Gaussian Naive Bayes | SVM -> Support Vector Machine | DT -> Decision Tree")
 st.write("RF -> Random Forest | AB -> AdaBoost | NN -> Neural Network | KN -> K-Neighbors")
@@ -81,43 +102,108 @@ with st.expander("EXAMPLE PHISHING URLs:"):
     st.caption("Phishing pages have short lifecycle! Examples may become outdated.")
 
 # ----- Model selection ----- #
+# Modo cascada: NB decide las páginas claras y sólo las dudosas van a la
+# votación de los modelos caros (ver cascade.py)
+cascade_info = ms.load_metadata(cascade.CASCADE_KEY)
+cascade_problem = cascade.check_cascade() if cascade_info else None
+if cascade_problem:
+    # Modelos actualizados después de calibrarla: no se ofrece
+    st.caption(cascade_problem)
+    cascade_info = None
+model_options = list(ms.MODEL_NAMES.values()) + ([cascade_info["name"]] if cascade_info else [])
 choice = st.selectbox(
     "Please select your machine learning model",
-    [
-        "Gaussian Naive Bayes", "Support Vector Machine", "Decision Tree",
-        "Random Forest", "AdaBoost", "Neural Network", "K-Neighbours"
-    ]
+    model_options
 )
 
-# Load selected model
-model_dict = {
-    "Gaussian Naive Bayes": ml.nb_model,
-    "Support Vector Machine": ml.svm_model,
-    "Decision Tree": ml.dt_model,
-    "Random Forest": ml.rf_model,
-    "AdaBoost": ml.ab_model,
-    "Neural Network": ml.nn_model,
-    "K-Neighbours": ml.kn_model
-}
-model = model_dict[choice]
-st.write(f"{choice} model is selected!")
+# Load selected model (sólo el elegido, una vez por proceso)
+@st.cache_resource
+def load_model(key):
+    return cascade.load_model(key, compiled=True)
+
+model_keys = {name: key for key, name in ms.MODEL_NAMES.items()}
+if cascade_info:
+    model_keys[cascade_info["name"]] = cascade.CASCADE_KEY
+model, model_info = load_model(model_keys[choice])
+model_features = fr.model_features(model)  # sólo se extraen las que usa el modelo
+st.write(f"{choice} model is selected! (version {model_info['version']})")
+
+backend = st.radio(
+    "HTML parser backend",
+    fe.BACKENDS,
+    help="soup: BeautifulSoup tree | stream: streaming tokenizer, no tree (faster, less memory)"
+)
 
 # ----- URL input and prediction ----- #
+# Caché compartida entre sesiones: URL -> hash del HTML -> veredicto
+@st.cache_resource
+def verdict_cache():
+    return vc.VerdictCache()
+
+# Valores de características ya calculados para ese HTML (feature_cache.py)
+@st.cache_resource
+def feature_cache():
+    return fc.FeatureCache()
+
+def score_page(url, version):
+    cache = verdict_cache()
+    verdict = cache.lookup_url(url, version)
+    if verdict is not None:
+        inst.incr("app.cache.url_hit")
+        return verdict
+    page = fetcher.fetch_body(url, timeout=5)
+    if page.status != 200:
+        return None
+    digest = vc.content_hash(page.body)
+    verdict = cache.lookup_content(url, digest, version)
+    if verdict is not None:
+        inst.incr("app.cache.content_hit")
+    else:
+        vector = fc.cached_vector(feature_cache(), page.body, backend=backend, features=model_features,
+                                  encoding=page.encoding, sha=digest)
+        with inst.timer("predict"):
+            result = model.predict(pd.DataFrame([vector], columns=model_features))  # must be 2D
+        verdict = vc.Verdict(int(result[0]), page.truncated)
+        cache.store(url, digest, version, verdict)
+    return verdict
+
+# ----- Instrumentación (ver instrumentation.py) ----- #
+show_timings = st.sidebar.checkbox("Show stage timings", value=inst.DEFAULT_ENABLED)
+profile_check = st.sidebar.checkbox("Sample-profile each check", disabled=not show_timings)
+inst.enable(inst.DEFAULT_ENABLED or show_timings)
+
 url = st.text_input("Enter the URL to analyze")
 if st.button("Check!"):
+    inst.incr("app.checks")
+    profiler = inst.SamplingProfiler() if profile_check else None
     try:
-        response = requests.get(url.strip(), verify=False, timeout=5)
-        if response.status_code != 200:
+        with inst.trace() as spans, inst.timer("app.check"), profiler or nullcontext():
+            verdict = score_page(url.strip(), vc.model_version(model_info))
+        if show_timings:
+            timings = pd.DataFrame(spans, columns=["stage", "ms"]).groupby("stage", sort=False).sum()
+            st.table(timings.round(3))
+            if profiler:
+                st.table(pd.DataFrame(profiler.top(), columns=["function", "samples", "share"]))
+        if verdict is None:
             st.error(f"HTTP connection was not successful for the URL: {url}")
         else:
-            soup = BeautifulSoup(response.content, "html.parser")
-            vector = [fe.create_vector(soup)]  # must be 2D array
-            result = model.predict(vector)
-            if result[0] == 0:
+            if verdict.truncated:
+                st.caption(f"Page larger than {fetcher.MAX_BYTES // 1024} KB: only the first part was analyzed.")
+            if verdict.prediction == 0:
                 st.success("This web page seems legitimate!")
                 st.balloons()
             else:
                 st.warning("Attention! This web page is potential PHISHING!")
                 st.snow()
     except requests.exceptions.RequestException as e:
+        inst.incr("app.errors")
         st.error(f"Error analyzing the URL: {e}")
+
+if show_timings:
+    with st.expander("METRICS (this process)"):
+        summary = inst.REGISTRY.summary()
+        if summary:
+            st.table(pd.DataFrame.from_dict(summary, orient="index"))
+        st.write(inst.snapshot()["counters"])
+        st.download_button("Download metrics (Prometheus text)", inst.REGISTRY.to_prometheus(),
+                           file_name="phishing_metrics.prom", mime="text/plain")
@@ -0,0 +1,148 @@
+# -----------------------------
+# Recolector asíncrono (asyncio + aiohttp)
+# -----------------------------
+# Sustituye el bucle secuencial de data_collector.create_structured_data:
+# - límite global de conexiones concurrentes y límite por host
+# - una única ClientSession, de modo que las conexiones se reutilizan
+# - el parseo y la extracción de características van a un pool de
+#   procesos, fuera del event loop
+# - el cuerpo se lee con el mismo presupuesto de bytes y los mismos
+#   Content-Type permitidos que fetcher.py
+# - con un índice de near_duplicates.py, los clones de páginas ya vistas no
+#   se extraen ni se archivan
+# - con una caché de feature_cache.py sólo se extraen las características
+#   que no estén ya guardadas para ese HTML
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import aiohttp
+import feature_extraction as fe
+import collector_steps as steps
+import fetcher
+import instrumentation as inst
+import near_duplicates as nd
+
+
+CONCURRENCY = 100   # peticiones en vuelo como máximo
+PER_HOST = 4        # conexiones simultáneas por host
+TIMEOUT = 4         # segundos, igual que requests.get(..., timeout=4)
+
+
+async def read_bounded(response, max_bytes):
+    # Igual que fetcher.iter_bounded: se deja de leer al pasar de max_bytes y
+    # se cuentan los mismos fetch.bytes y fetch.truncated
+    chunks, received = [], 0
+    async for chunk in response.content.iter_chunked(fetcher.CHUNK_SIZE):
+        if received + len(chunk) > max_bytes:
+            chunks.append(chunk[:max_bytes - received])
+            received = max_bytes
+            inst.incr("fetch.truncated")
+            break
+        received += len(chunk)
+        chunks.append(chunk)
+    inst.incr("fetch.bytes", received)
+    return b"".join(chunks)
+
+
+async def fetch(session, i, url, max_bytes=fetcher.MAX_BYTES):
+    # (status, headers, cuerpo, charset); el cuerpo de las respuestas que no
+    # son 200 no se descarga
+    try:
+        with inst.timer("collector.fetch"):
+            async with session.get(url) as response:
+                headers = dict(response.headers)
+                if response.status != 200:
+                    return response.status, headers, b"", None
+                charset = fetcher.check_content_type(response.headers)
+                body = await read_bounded(response, max_bytes)
+                return response.status, headers, body, charset
+    except (aiohttp.ClientError, asyncio.TimeoutError, fetcher.ContentRejected) as e:
+        steps.failed(i, repr(e))
+        return None
+
+
+async def worker(queue, session, executor, backend, data_list, archive, max_bytes, dedup, cache):
+    # Los pasos de cada página están en collector_steps.py; la firma y la
+    # extracción van al pool
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        i, url = item
+        fetched = await fetch(session, i, url, max_bytes)
+        if fetched is None:
+            continue
+        status, headers, body, charset = fetched
+        if dedup is not None and status == 200:
+            with inst.timer("collector.signature"):
+                signature = await loop.run_in_executor(executor, nd.signature, body)
+            if steps.is_duplicate(dedup, i, url, signature):
+                continue
+        if not steps.keep_page(i, url, status, headers, body, archive):
+            continue
+        sha, known, missing = steps.lookup(cache, body)
+        values = []
+        if missing:
+            # Medido desde aquí: incluye la espera en el pool y el paso de datos
+            with inst.timer("collector.extract"):
+                values = await loop.run_in_executor(executor, fe.create_vector, body, backend, missing, charset)
+        data_list.append(steps.finish(url, sha, known, missing, values, cache))
+
+
+async def collect(url_list, backend=fe.DEFAULT_BACKEND, concurrency=CONCURRENCY,
+                  per_host=PER_HOST, timeout=TIMEOUT, executor=None, archive=None,
+                  max_bytes=fetcher.MAX_BYTES, dedup=None, cache=None):
+    # archive: html_archive.ArchiveWriter opcional donde guardar cada respuesta
+    # max_bytes: presupuesto de bytes por página (ver fetcher.py)
+    # dedup: near_duplicates.NearDuplicateIndex opcional, compartido entre lotes
+    # cache: feature_cache.FeatureCache opcional
+    # url_list puede ser cualquier iterable (también un generador): la cola
+    # acotada evita cargar todas las URLs en memoria a la vez
+    data_list = []
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ssl=False)
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor()
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+            workers = [
+                asyncio.create_task(worker(queue, session, executor, backend, data_list, archive, max_bytes, dedup, cache))
+                for _ in range(concurrency)
+            ]
+            for item in enumerate(url_list):
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    return data_list
+
+
+def create_structured_data(url_list, backend=fe.DEFAULT_BACKEND, **kwargs):
+    return asyncio.run(collect(url_list, backend=backend, **kwargs))
+
+
+# -----------------------------
+# Prueba contra el servidor local
+# -----------------------------
+
+if __name__ == "__main__":
+    import time
+    import local_server
+
+    server, base_url = local_server.start_server(delay=0.5, failure_rate=0.2)
+    urls = local_server.page_urls(base_url, 200)
+
+    start = time.perf_counter()
+    data = create_structured_data(urls, concurrency=50, per_host=50)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"{len(data)} / {len(urls)} pages collected in {elapsed:.2f}s")
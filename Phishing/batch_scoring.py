@@ -0,0 +1,237 @@
+# -----------------------------
+# Puntuación masiva de URLs o ficheros HTML
+# -----------------------------
+# Alternativa al botón Check! de app.py para colas de triaje:
+# - la descarga y la extracción de características se reparten en un pool
+#   de procesos
+# - las filas se agrupan en bloques y el modelo hace un único
+#   predict/predict_proba por bloque
+# - los resultados salen en streaming como CSV o JSONL, con tiempos por item
+# - --metrics/--profile recogen las métricas de instrumentation.py y las
+#   muestras del perfilador de todos los procesos del pool
+#
+#   python batch_scoring.py urls.csv --model RF --format jsonl --output out.jsonl
+#   python batch_scoring.py mini_dataset/ --model NB
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from multiprocessing import Pool
+import pandas as pd
+import requests
+import feature_extraction as fe
+import feature_registry as fr
+import model_store as ms
+import cascade
+import fetcher
+import url_source
+import instrumentation as inst
+
+
+CHUNK_ROWS = 256
+FIELDS = ["item", "status", "prediction", "probability", "truncated", "extract_ms", "predict_ms", "error"]
+
+_session = None
+_profiler = None
+
+
+def get_session():
+    # Una sesión por proceso del pool: reutiliza conexiones entre URLs
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+
+def extract_url(job):
+    url, backend, features, max_bytes = job
+    start = time.perf_counter()
+    result = {"item": url, "status": None, "vector": None, "truncated": False, "error": None}
+    try:
+        page = fetcher.fetch_page(url, session=get_session(), backend=backend,
+                                  features=features, max_bytes=max_bytes)
+        result["status"] = page.status
+        result["truncated"] = page.truncated
+        if page.status == 200:
+            result["vector"] = page.vector
+        else:
+            result["error"] = f"HTTP {page.status}"
+    except requests.exceptions.RequestException as e:
+        result["error"] = str(e)
+    result["extract_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def extract_html_file(job):
+    path, backend, features, _ = job
+    start = time.perf_counter()
+    result = {"item": path, "status": None, "vector": None, "truncated": False, "error": None}
+    try:
+        with open(path, "rb") as f:
+            result["vector"] = fe.create_vector(f.read(), backend=backend, features=features)
+    except OSError as e:
+        result["error"] = str(e)
+    result["extract_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def iter_jobs(source, backend, features, max_bytes):
+    if os.path.isdir(source):
+        for entry in os.scandir(source):
+            if entry.name.endswith(".html"):
+                yield extract_html_file, (entry.path, backend, features, max_bytes)
+    else:
+        for url in url_source.iter_urls(source, dedup_hosts=False):
+            yield extract_url, (url, backend, features, max_bytes)
+
+
+def init_worker(metrics, profile):
+    global _profiler
+    inst.enable(metrics)
+    if profile:
+        _profiler = inst.SamplingProfiler().start()
+
+
+def run_job(task):
+    # Las métricas y muestras del worker viajan al padre con cada resultado
+    function, job = task
+    result = function(job)
+    if inst.ENABLED:
+        result["metrics"] = inst.REGISTRY.drain()
+    if _profiler is not None:
+        result["profile"] = _profiler.drain()
+    return result
+
+
+def imap_window(pool, function, jobs, window):
+    # Como pool.imap, pero con como mucho window trabajos enviados sin
+    # recoger: los trabajos se leen según se consumen los resultados y la
+    # memoria no depende del tamaño de la lista (imap la vacía de entrada)
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.apply_async(function, (job,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def iter_chunks(results, size):
+    chunk = []
+    for result in results:
+        chunk.append(result)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def predict_chunk(model, features, chunk):
+    scored = [r for r in chunk if r["vector"] is not None]
+    for r in chunk:
+        r.update(prediction=None, probability=None, predict_ms=0.0)
+    if not scored:
+        return chunk
+
+    start = time.perf_counter()
+    X = pd.DataFrame([r["vector"] for r in scored], columns=features)
+    predictions, probabilities = ms.predict_with_proba(model, X)
+    # Tiempo de inferencia del bloque repartido entre sus filas
+    chunk_ms = (time.perf_counter() - start) * 1000
+    inst.observe("predict.chunk", chunk_ms)
+    per_item = chunk_ms / len(scored)
+
+    for i, r in enumerate(scored):
+        r["prediction"] = int(predictions[i])
+        r["probability"] = round(float(probabilities[i]), 4) if probabilities is not None else None
+        r["predict_ms"] = per_item
+    return chunk
+
+
+class ResultWriter:
+
+    def __init__(self, out, fmt):
+        self.out = out
+        self.fmt = fmt
+        if fmt == "csv":
+            self.writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+            self.writer.writeheader()
+
+    def write(self, result):
+        row = {field: result.get(field) for field in FIELDS}
+        row["extract_ms"] = round(row["extract_ms"], 2)
+        row["predict_ms"] = round(row["predict_ms"], 3)
+        if self.fmt == "csv":
+            self.writer.writerow(row)
+        else:
+            self.out.write(json.dumps(row) + "\n")
+
+
+def merge_worker_data(results, profiler):
+    for result in results:
+        if "metrics" in result:
+            inst.merge(result.pop("metrics"))
+        if "profile" in result:
+            profiler.merge(result.pop("profile"))
+        inst.incr("batch.items.error" if result["vector"] is None else "batch.items.ok")
+        inst.observe("batch.extract", result["extract_ms"])
+        yield result
+
+
+def score(source, model_key="RF", out=sys.stdout, fmt="csv", backend="stream",
+          workers=None, chunk_rows=CHUNK_ROWS, max_bytes=fetcher.MAX_BYTES, profiler=None):
+    # profiler: inst.SamplingProfiler donde juntar las muestras de los workers
+    model, _ = cascade.load_model(model_key, compiled=True)
+    features = fr.model_features(model)
+    writer = ResultWriter(out, fmt)
+
+    count = 0
+    with Pool(workers, initializer=init_worker, initargs=(inst.ENABLED, profiler is not None)) as pool:
+        # Dos bloques en vuelo: el pool sigue extrayendo mientras se predice uno
+        results = imap_window(pool, run_job, iter_jobs(source, backend, features, max_bytes), 2 * chunk_rows)
+        for chunk in iter_chunks(merge_worker_data(results, profiler), chunk_rows):
+            for result in predict_chunk(model, features, chunk):
+                writer.write(result)
+                count += 1
+            out.flush()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a URL list or a directory of HTML files")
+    parser.add_argument("source", help="URL file (PhishTank/Tranco CSV) or directory of .html files")
+    parser.add_argument("--model", default="RF", choices=list(ms.MODEL_NAMES) + [cascade.CASCADE_KEY])
+    parser.add_argument("--format", default="csv", choices=["csv", "jsonl"])
+    parser.add_argument("--output", help="output file (default: stdout)")
+    parser.add_argument("--backend", default="stream", choices=fe.BACKENDS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--metrics", help="write stage timings and counters here (.json or .prom)")
+    parser.add_argument("--profile", help="write sampled stacks of the workers here (collapsed format)")
+    args = parser.parse_args()
+    if args.model == cascade.CASCADE_KEY and cascade.check_cascade():
+        parser.error(cascade.check_cascade())
+
+    if args.metrics:
+        inst.enable()
+    profiler = inst.SamplingProfiler() if args.profile else None
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        start = time.perf_counter()
+        n = score(args.source, args.model, out, args.format, args.backend, args.workers, args.chunk,
+                  profiler=profiler)
+        print(f"{n} items scored in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    finally:
+        if args.output:
+            out.close()
+    if args.metrics:
+        inst.export(args.metrics)
+    if profiler is not None:
+        profiler.write_collapsed(args.profile)
+        for name, samples, share in profiler.top(10):
+            print(f"{share:6.1%}  {name}", file=sys.stderr)
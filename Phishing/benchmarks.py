@@ -0,0 +1,260 @@
+# -----------------------------
+# Benchmarks del pipeline
+# -----------------------------
+# Mide, con mini_dataset y páginas sintéticas de varios MB (las de
+# mini_dataset concatenadas):
+# - parseo por página (BeautifulSoup y tokenizador en streaming)
+# - create_vector total por backend y cada característica por separado
+# - fit, latencia de predict de una fila y filas/s de los siete modelos
+# - pico de memoria de la extracción
+# - una recolección completa (sharded_collection + merge) contra local_server
+#
+# Los resultados van a un JSON plano {métrica: {"value", "unit"}} y el modo
+# compare marca las métricas que empeoran más de un umbral entre dos runs.
+#
+#   python benchmarks.py run --output bench.json [--quick]
+#   python benchmarks.py compare base.json bench.json [--threshold 0.25]
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+import subprocess
+import numpy as np
+from bs4 import BeautifulSoup
+import features
+import feature_engine
+import feature_extraction as fe
+import feature_registry as fr
+import local_server
+
+
+DATASET_DIR = "mini_dataset"
+SYNTHETIC_MB = (1, 4)
+MODEL_ROWS = 5000
+COLLECTOR_URLS = 200
+COLLECTOR_DELAY = 0.02   # segundos por respuesta del servidor local
+THRESHOLD = 0.25         # compare: +25 % se considera regresión
+
+
+def median_ms(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def peak_mb(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def synthetic_page(pages, size):
+    # Concatena las páginas de mini_dataset en bucle hasta `size` bytes
+    parts, total, i = [], 0, 0
+    while total < size:
+        parts.append(pages[i % len(pages)])
+        total += len(parts[-1])
+        i += 1
+    return b"".join(parts)
+
+
+def page_groups(dataset_dir, synthetic_mb):
+    pages = local_server.load_pages(dataset_dir)
+    groups = {"mini": pages}
+    for mb in synthetic_mb:
+        groups[f"synthetic_{mb}mb"] = [synthetic_page(pages, mb * 2**20)]
+    return groups
+
+
+# ----- Parseo y extracción ----- #
+def bench_extraction(results, groups, repeat):
+    for group, pages in groups.items():
+        # Media por página del grupo
+        n = len(pages)
+        results[f"parse.soup.{group}"] = sum(
+            median_ms(lambda: BeautifulSoup(page, "html.parser"), repeat) for page in pages) / n
+        results[f"parse.stream.{group}"] = sum(
+            median_ms(lambda: feature_engine.scan_stream(page), repeat) for page in pages) / n
+        for backend in fe.BACKENDS:
+            results[f"create_vector.{backend}.{group}"] = sum(
+                median_ms(lambda: fe.create_vector(page, backend=backend), repeat) for page in pages) / n
+
+    # Por característica, sobre la página más grande: el coste de calcular
+    # sólo esa con el motor actual y con la función original de features.py
+    largest = max((page for pages in groups.values() for page in pages), key=len)
+    soup = BeautifulSoup(largest, "html.parser")
+    for name in fr.FEATURE_NAMES:
+        results[f"feature.stream.{name}"] = median_ms(
+            lambda: fe.create_vector(largest, backend="stream", features=[name]), repeat)
+        results[f"feature.reference.{name}"] = median_ms(lambda: getattr(features, name)(soup), repeat)
+
+    for backend in fe.BACKENDS:
+        results[f"memory.create_vector.{backend}.largest"] = peak_mb(
+            lambda: fe.create_vector(largest, backend=backend))
+
+
+# ----- Modelos ----- #
+def bench_models(results, rows, repeat, seed=0):
+    import machine_learning as ml
+    import tree_predictor
+    from datasets import load_datasets, prepare_data
+
+    legitimate_df, phishing_df = load_datasets(urls=False)
+    _, X, Y = prepare_data(legitimate_df, phishing_df)
+    # Se remuestrea hasta `rows` filas para que los tiempos sean comparables
+    index = np.random.default_rng(seed).integers(0, len(X), rows)
+    X, Y = X.iloc[index].reset_index(drop=True), Y.iloc[index].reset_index(drop=True)
+    row = X.iloc[[0]]
+
+    for name, model in ml.create_models().items():
+        start = time.perf_counter()
+        model.fit(X, Y)
+        results[f"model.{name}.fit"] = (time.perf_counter() - start) * 1000
+        results[f"model.{name}.predict_row"] = median_ms(lambda: model.predict(row), repeat * 4)
+        batch_ms = median_ms(lambda: model.predict(X), repeat)
+        results[f"model.{name}.throughput"] = rows / (batch_ms / 1000)
+        if tree_predictor.supports(model):
+            compiled = tree_predictor.TreePredictor(tree_predictor.export_arrays(model))
+            results[f"model.{name}.compiled_predict_row"] = median_ms(lambda: compiled.predict(row), repeat * 4)
+
+
+# ----- Recolección ----- #
+def bench_collector(results, n_urls, delay, dataset_dir):
+    import sharded_collection as sc
+
+    server, base_url = local_server.start_server(dataset_dir, delay=delay)
+    urls = local_server.page_urls(base_url, n_urls)
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        for engine in ("sync", "async"):
+            run_dir = os.path.join(work_dir, engine)
+            start = time.perf_counter()
+            for shard in range(2):
+                # Sin dedup ni caché de características: las URLs repiten en
+                # bucle las páginas de mini_dataset y se quiere medir la extracción
+                sc.run_shard(urls, shard, 2, run_dir, engine=engine,
+                             archive_dir=os.path.join(run_dir, "archive"), dedup=False, cache_path=None)
+            df = sc.merge_shards(run_dir, 2, os.path.join(run_dir, "out.csv"), label=1)
+            seconds = time.perf_counter() - start
+            results[f"collector.{engine}.total"] = seconds * 1000
+            results[f"collector.{engine}.pages_per_s"] = len(df) / seconds
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ----- Resultados ----- #
+def unit(metric):
+    if metric.endswith((".throughput", ".pages_per_s")):
+        return "per_s"
+    if metric.startswith("memory."):
+        return "MB"
+    return "ms"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(output, quick=False, dataset_dir=DATASET_DIR):
+    # quick: una repetición, una sola página sintética y 1/5 de filas y URLs
+    repeat = 1 if quick else 3
+    scale = 5 if quick else 1
+    groups = page_groups(dataset_dir, SYNTHETIC_MB[:1] if quick else SYNTHETIC_MB)
+    results = {}
+
+    start = time.perf_counter()
+    bench_extraction(results, groups, repeat)
+    print(f"extraction: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    start = time.perf_counter()
+    bench_models(results, MODEL_ROWS // scale, repeat)
+    print(f"models: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    start = time.perf_counter()
+    bench_collector(results, COLLECTOR_URLS // scale, COLLECTOR_DELAY, dataset_dir)
+    print(f"collector: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    results["memory.maxrss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": quick,
+            "schema_fingerprint": fr.schema_fingerprint(),
+        },
+        "results": {metric: {"value": round(value, 4), "unit": unit(metric)}
+                    for metric, value in results.items()},
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def compare(base, new, threshold=THRESHOLD):
+    # Devuelve (regresiones, mejoras) como listas de (métrica, antes, después, cambio)
+    regressions, improvements = [], []
+    for metric, entry in new["results"].items():
+        if metric not in base["results"]:
+            continue
+        before, after = base["results"][metric]["value"], entry["value"]
+        if before <= 0:
+            continue
+        change = after / before - 1
+        worse = -change if entry["unit"] == "per_s" else change   # per_s: más es mejor
+        row = (metric, before, after, change)
+        if worse > threshold:
+            regressions.append(row)
+        elif worse < -threshold:
+            improvements.append(row)
+    return regressions, improvements
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phishing pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--output", default="bench.json")
+    run_parser.add_argument("--quick", action="store_true", help="fewer repeats, smaller inputs")
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.output, args.quick)
+        print(f"{len(report['results'])} metrics written to {args.output}")
+    else:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        for key in ("quick", "cpu_count", "python"):
+            if base["meta"].get(key) != new["meta"].get(key):
+                print(f"Warning: runs differ in {key}: {base['meta'].get(key)} vs {new['meta'].get(key)}")
+        regressions, improvements = compare(base, new, args.threshold)
+        for title, rows in (("Regressions", regressions), ("Improvements", improvements)):
+            print(f"{title} (>{args.threshold:.0%}): {len(rows)}")
+            for metric, before, after, change in sorted(rows, key=lambda r: -abs(r[3])):
+                print(f"  {metric:55s} {before:12.3f} -> {after:12.3f}  ({change:+.0%})")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,202 @@
+# -----------------------------
+# Cascada de modelos según coste
+# -----------------------------
+# GaussianNB es mucho más barato que MLP, AdaBoost o KNN. En modo cascada:
+#
+#   1. el modelo barato (STAGES) puntúa todas las páginas; si su probabilidad
+#      de phishing es >= high o <= low, decide él
+#   2. sólo las páginas dudosas pasan a la votación de los modelos caros
+#      (ENSEMBLE, mayoría simple)
+#
+# low/high se calibran con las predicciones fuera de fold de la validación
+# cruzada de machine_learning.py: son los umbrales más amplios con los que
+# el modelo barato acierta, en lo que decide, al menos tanto como la votación.
+# La configuración se guarda en models/CASCADE/ con el mismo formato de
+# versiones que model_store.py, junto a las versiones de los modelos usados.
+
+import numpy as np
+import pandas as pd
+import feature_registry as fr
+import model_store as ms
+
+
+CASCADE_KEY = "CASCADE"
+STAGES = ("NB",)
+ENSEMBLE = ("SVM", "RF", "AB", "NN", "KN")
+
+# Umbrales que nunca se alcanzan: la etapa no decide nada por ese lado
+NEVER_HIGH = 2.0
+NEVER_LOW = -1.0
+
+
+# ----- Calibración ----- #
+def threshold_high(proba, y, target):
+    # Umbral más bajo con el que las páginas proba >= t son phishing con
+    # una tasa de acierto >= target
+    order = np.argsort(-proba, kind="stable")
+    p = proba[order]
+    accuracy = np.cumsum(y[order] == 1) / np.arange(1, len(p) + 1)
+    cuts = np.r_[p[1:] != p[:-1], True]   # no partir grupos de probabilidades iguales
+    ok = np.flatnonzero(cuts & (accuracy >= target))
+    return float(p[ok[-1]]) if len(ok) else NEVER_HIGH
+
+
+def threshold_low(proba, y, target):
+    # Simétrico: umbral más alto con el que proba <= t son legítimas
+    return 1.0 - threshold_high(1.0 - proba, 1 - y, target)
+
+
+def decide(proba, low, high):
+    # 1 phishing, 0 legítima, -1 dudosa
+    phishing, legitimate = proba >= high, proba <= low
+    out = np.full(len(proba), -1, dtype=np.int64)
+    out[phishing & ~legitimate] = 1
+    out[legitimate & ~phishing] = 0
+    return out
+
+
+def vote(predictions):
+    # Mayoría simple; el empate cuenta como phishing
+    return (np.mean(predictions, axis=0) >= 0.5).astype(np.int64)
+
+
+def measures(y, pred):
+    tp = int(np.sum((pred == 1) & (y == 1)))
+    tn = int(np.sum((pred == 0) & (y == 0)))
+    fp = int(np.sum((pred == 1) & (y == 0)))
+    fn = int(np.sum((pred == 0) & (y == 1)))
+    return {
+        "accuracy": (tp + tn) / len(y) if len(y) else 0,
+        "precision": tp / (tp + fp) if (tp + fp) else 0,
+        "recall": tp / (tp + fn) if (tp + fn) else 0,
+    }
+
+
+def calibrate(oof, y, stages=STAGES, ensemble=ENSEMBLE, target=None):
+    # oof: {modelo: {"pred": ..., "proba": ...}} de machine_learning.cross_validate
+    y = np.asarray(y).astype(np.int64)
+    ensemble_pred = vote([oof[key]["pred"] for key in ensemble])
+    if target is None:
+        target = measures(y, ensemble_pred)["accuracy"]
+
+    pred = np.full(len(y), -1, dtype=np.int64)
+    remaining = np.arange(len(y))
+    thresholds = {}
+    for key in stages:
+        proba = oof[key]["proba"][remaining]
+        high = threshold_high(proba, y[remaining], target)
+        low = threshold_low(proba, y[remaining], target)
+        thresholds[key] = [low, high]
+        decided = decide(proba, low, high)
+        pred[remaining[decided >= 0]] = decided[decided >= 0]
+        remaining = remaining[decided < 0]
+    pred[remaining] = ensemble_pred[remaining]
+
+    metrics = measures(y, pred)
+    metrics["early_exit"] = 1 - len(remaining) / len(y) if len(y) else 0
+    metrics["ensemble_accuracy"] = measures(y, ensemble_pred)["accuracy"]
+    return {
+        "stages": list(stages),
+        "ensemble": list(ensemble),
+        "thresholds": thresholds,
+        "target_accuracy": target,
+        "cv_metrics": metrics,
+    }
+
+
+def save_cascade(config, models_dir=ms.MODELS_DIR):
+    keys = config["stages"] + config["ensemble"]
+    metadata = {
+        "name": "Cascade (" + " -> ".join(config["stages"]) + " -> ensemble vote)",
+        # Los umbrales sólo valen para estas versiones de los modelos
+        "model_versions": {key: ms.latest_version(key, models_dir) for key in keys},
+        "schema_version": fr.SCHEMA_VERSION,
+        "schema_fingerprint": fr.schema_fingerprint(fr.FEATURE_NAMES),
+        "features": list(fr.FEATURE_NAMES),
+    }
+    metadata.update(config)
+    return ms.save_metadata(CASCADE_KEY, metadata, models_dir)
+
+
+# ----- Inferencia ----- #
+class Cascade:
+    # Se usa como un modelo de sklearn: predict(DataFrame) y feature_names_in_
+
+    def __init__(self, metadata, models_dir=ms.MODELS_DIR, compiled=False):
+        ms.check_schema(metadata)
+        self.metadata = metadata
+        self.stages = metadata["stages"]
+        self.ensemble = metadata["ensemble"]
+        self.thresholds = metadata["thresholds"]
+        self.models = {}
+        self.features = {}
+        for key in self.stages + self.ensemble:
+            model, info = ms.load_model(key, models_dir=models_dir, compiled=compiled)
+            if info["version"] != metadata["model_versions"][key]:
+                raise ValueError(
+                    f"Cascade v{metadata['version']} was calibrated with {key} "
+                    f"v{metadata['model_versions'][key]}, found v{info['version']}: retrain to recalibrate"
+                )
+            self.models[key] = model
+            self.features[key] = fr.model_features(model)
+        self.feature_names_in_ = np.array(metadata["features"], dtype=object)
+        # Filas resueltas por cada etapa (y por la votación)
+        self.exits = {key: 0 for key in self.stages + ["vote"]}
+
+    def _rows(self, X, key, rows):
+        return X.iloc[rows][self.features[key]]
+
+    def predict(self, X):
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(X, columns=self.metadata["features"])
+        pred = np.full(len(X), -1, dtype=np.int64)
+        remaining = np.arange(len(X))
+        for key in self.stages:
+            if not len(remaining):
+                break
+            model = self.models[key]
+            rows = self._rows(X, key, remaining)
+            proba = model.predict_proba(rows)[:, 1] if hasattr(model, "predict_proba") else model.predict(rows)
+            decided = decide(proba, *self.thresholds[key])
+            pred[remaining[decided >= 0]] = decided[decided >= 0]
+            self.exits[key] += int(np.sum(decided >= 0))
+            remaining = remaining[decided < 0]
+
+        if len(remaining):
+            pred[remaining] = vote([self.models[key].predict(self._rows(X, key, remaining))
+                                    for key in self.ensemble])
+            self.exits["vote"] += len(remaining)
+        return pred
+
+
+def check_cascade(models_dir=ms.MODELS_DIR):
+    # None si la última cascada se puede cargar; si no, el motivo. Tras
+    # incremental_training.py sin recalibrar, algún modelo tiene una versión
+    # distinta de la calibrada
+    metadata = ms.load_metadata(CASCADE_KEY, models_dir=models_dir)
+    if metadata is None:
+        return f"No cascade in {models_dir}: run machine_learning.py"
+    stale = [f"{key} v{version} -> v{ms.latest_version(key, models_dir)}"
+             for key, version in metadata["model_versions"].items()
+             if ms.latest_version(key, models_dir) != version]
+    if stale:
+        return (f"Cascade v{metadata['version']} is out of date ({', '.join(stale)}): "
+                f"run machine_learning.py to recalibrate it")
+    return None
+
+
+def load_cascade(version=None, models_dir=ms.MODELS_DIR, compiled=False):
+    metadata = ms.load_metadata(CASCADE_KEY, version, models_dir)
+    if metadata is None:
+        return None, None
+    return Cascade(metadata, models_dir, compiled), metadata
+
+
+def load_model(key, version=None, models_dir=ms.MODELS_DIR, compiled=False):
+    # Como model_store.load_model, aceptando también CASCADE_KEY
+    if key == CASCADE_KEY:
+        model, metadata = load_cascade(version, models_dir, compiled)
+        if model is None:
+            raise FileNotFoundError(f"No cascade in {models_dir}: run machine_learning.py")
+        return model, metadata
+    return ms.load_model(key, version, models_dir, compiled)
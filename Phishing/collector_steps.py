@@ -0,0 +1,72 @@
+# -----------------------------
+# Pasos por página comunes a los motores de recolección
+# -----------------------------
+# data_collector.py (sync), async_collector.py y pipeline.py descargan y
+# extraen de forma distinta (en un bucle, en el event loop, repartido entre
+# hilos), pero cada página pasa por los mismos pasos, con los mismos
+# contadores y mensajes:
+#
+#   is_duplicate   clon de una página ya recogida (near_duplicates.py): se descarta
+#   keep_page      se archiva la respuesta (también las de error HTTP) y se
+#                  descartan las que no son 200
+#   lookup         características ya guardadas en la caché y las que faltan
+#   (extracción de las que faltan: la hace cada motor a su manera)
+#   finish         guarda en la caché lo calculado y devuelve la fila
+#
+# Una descarga fallida se apunta con failed().
+
+import feature_registry as fr
+import feature_cache
+import instrumentation as inst
+import verdict_cache as vc
+
+
+def failed(i, error):
+    inst.incr("collector.failed")
+    print(i, "-->", error)
+
+
+def is_duplicate(dedup, i, url, signature):
+    # dedup: near_duplicates.NearDuplicateIndex o None
+    if dedup is None:
+        return False
+    original = dedup.check(url, signature)
+    if original is None:
+        return False
+    inst.incr("collector.near_duplicate")
+    print(i, "Near-duplicate of", original + ":", url)
+    return True
+
+
+def keep_page(i, url, status, headers, body, archive):
+    # True si hay que extraer la página
+    if archive is not None:
+        archive.add(url, status, headers, body or b"")
+    if status != 200:
+        inst.incr("collector.http_error")
+        print(i, "HTTP error:", url)
+        return False
+    return True
+
+
+def lookup(cache, body):
+    # (sha, valores ya conocidos, características que faltan por extraer)
+    if cache is None:
+        return None, {}, list(fr.FEATURE_NAMES)
+    sha = vc.content_hash(body)
+    with inst.timer("feature_cache.lookup"):
+        known = cache.lookup_many([sha]).get(sha, {})
+    return sha, known, feature_cache.missing_features(known, fr.FEATURE_NAMES)
+
+
+def finish(url, sha, known, missing, values, cache):
+    # values: lo extraído para missing, en el mismo orden
+    computed = dict(zip(missing, values))
+    known.update(computed)
+    if cache is not None:
+        inst.incr("feature_cache.hit_values", len(fr.FEATURE_NAMES) - len(missing))
+        if missing:
+            inst.incr("feature_cache.miss_values", len(missing))
+            cache.store_many([(sha, computed)])
+    inst.incr("collector.ok")
+    return [known[name] for name in fr.FEATURE_NAMES] + [url]
@@ -0,0 +1,180 @@
+# -----------------------------
+# Formato binario compacto para los datasets
+# -----------------------------
+# Los CSV guardan 22 enteros pequeños por fila que pandas lee como int64, más
+# una columna URL que machine_learning.py descarta enseguida. Aquí cada
+# columna es un .npy con el tipo más estrecho posible y se abre con mmap:
+#
+#   <dataset>.cols/meta.json          esquema, filas, tipo de cada columna y
+#                                     tamaño/fecha del CSV de origen
+#   <dataset>.cols/<feature>.npy      banderas -> uint8, contadores -> uint8/16/32
+#   <dataset>.cols/label.npy          uint8
+#   <dataset>.cols/urls.bin           URLs en UTF-8 concatenadas
+#   <dataset>.cols/url_offsets.npy    uint64, n + 1 offsets dentro de urls.bin
+#
+# Las banderas van en un byte (no en un bit) para poder leerlas por mmap sin
+# desempaquetar. Las URLs sólo se decodifican si se piden, todas de una
+# vez. Si el CSV cambia después (merge_shards, rebuild_structured_data) la
+# copia deja de estar al día (is_fresh) y datasets.read_dataset la rehace.
+#
+#   python compact_dataset.py structured_data_legitimate.csv structured_data_phishing.csv
+
+import os
+import sys
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import feature_registry as fr
+
+
+SUFFIX = ".cols"
+FORMAT_VERSION = 1
+
+
+def compact_path(csv_path):
+    return os.path.splitext(csv_path)[0] + SUFFIX
+
+
+def narrow_dtype(values, kind):
+    if kind == "bool":
+        return np.uint8
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    if low >= 0:
+        return np.min_scalar_type(high)
+    return np.promote_types(np.min_scalar_type(low), np.min_scalar_type(-high - 1))
+
+
+def source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_dataset(df, path, source=None):
+    # Se escribe en <path>.tmp y se cambia por el directorio anterior al
+    # final: una conversión a medias nunca queda junto a un meta.json válido
+    fr.check_columns(df.columns)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    columns = {}
+    for feature in fr.FEATURES:
+        values = df[feature.name].to_numpy()
+        dtype = narrow_dtype(values, feature.dtype)
+        np.save(os.path.join(tmp_path, feature.name + ".npy"), values.astype(dtype))
+        columns[feature.name] = np.dtype(dtype).name
+
+    if "label" in df.columns:
+        np.save(os.path.join(tmp_path, "label.npy"), df["label"].to_numpy().astype(np.uint8))
+
+    has_urls = "URL" in df.columns
+    if has_urls:
+        encoded = [str(url).encode("utf-8") for url in df["URL"]]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        with open(os.path.join(tmp_path, "urls.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(os.path.join(tmp_path, "url_offsets.npy"), offsets)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "schema_version": fr.SCHEMA_VERSION,
+        "schema_fingerprint": fr.schema_fingerprint(),
+        "rows": int(len(df)),
+        "columns": columns,
+        "label": "label" in df.columns,
+        "urls": has_urls,
+        "source": source,
+    }
+    # meta.json al final: marca el dataset como completo
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return meta
+
+
+def convert_csv(csv_path, path=None):
+    source = source_stamp(csv_path)
+    return write_dataset(pd.read_csv(csv_path), path or compact_path(csv_path), source)
+
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_fresh(csv_path, path=None):
+    # True si existe la copia compacta y se hizo con el CSV tal como está ahora
+    path = path or compact_path(csv_path)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return read_meta(path).get("source") == source_stamp(csv_path)
+
+
+class CompactDataset:
+
+    def __init__(self, path, mmap_mode="r"):
+        self.meta = read_meta(path)
+        if self.meta["schema_fingerprint"] != fr.schema_fingerprint():
+            raise ValueError(
+                f"{path} was written with feature schema v{self.meta['schema_version']}, "
+                f"current schema is v{fr.SCHEMA_VERSION}"
+            )
+        self.path = path
+        self.rows = self.meta["rows"]
+        self.columns = {
+            name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+            for name in fr.FEATURE_NAMES
+        }
+        self.label = np.load(os.path.join(path, "label.npy"), mmap_mode=mmap_mode) if self.meta["label"] else None
+        self._url_offsets = None
+
+    def feature_matrix(self, features=None, dtype=np.float32):
+        names = features or fr.FEATURE_NAMES
+        matrix = np.empty((self.rows, len(names)), dtype=dtype)
+        for j, name in enumerate(names):
+            matrix[:, j] = self.columns[name]
+        return matrix
+
+    def _url_table(self):
+        if self._url_offsets is None:
+            self._url_offsets = np.load(os.path.join(self.path, "url_offsets.npy"), mmap_mode="r")
+            self._urls = np.memmap(os.path.join(self.path, "urls.bin"), dtype=np.uint8, mode="r") \
+                if self._url_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+        return self._url_offsets, self._urls
+
+    def url(self, i):
+        offsets, blob = self._url_table()
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        return blob[start:end].tobytes().decode("utf-8")
+
+    def urls(self):
+        # urls.bin se decodifica de una vez; los offsets en bytes se pasan a
+        # caracteres restando los bytes de continuación UTF-8 (10xxxxxx)
+        # que hay antes de cada uno
+        offsets, blob = self._url_table()
+        text = blob.tobytes().decode("utf-8")
+        if len(text) != len(blob):
+            continuation = np.zeros(len(blob) + 1, dtype=np.int64)
+            np.cumsum((blob & 0xC0) == 0x80, out=continuation[1:])
+            offsets = offsets - continuation[offsets]
+        bounds = np.asarray(offsets, dtype=np.int64).tolist()
+        return [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def load_dataset(path, mmap_mode="r"):
+    return CompactDataset(path, mmap_mode)
+
+
+if __name__ == "__main__":
+    for csv_path in sys.argv[1:] or ["structured_data_legitimate.csv", "structured_data_phishing.csv"]:
+        meta = convert_csv(csv_path)
+        print(f"{csv_path} -> {compact_path(csv_path)} ({meta['rows']} rows)")
@@ -2,12 +2,16 @@
 # 6.9 De URL a Vector Numérico
 # -----------------------------
 
+import os
 import requests as re
 from urllib3.exceptions import InsecureRequestWarning
 from urllib3 import disable_warnings
-from bs4 import BeautifulSoup
-import pandas as pd
+import fetcher
 import feature_extraction as fe
+import feature_cache
+import collector_steps as steps
+import instrumentation as inst
+import near_duplicates as nd
 
 disable_warnings(InsecureRequestWarning)
 
@@ -20,103 +24,104 @@ disable_warnings(InsecureRequestWarning)
 url_filename = "verified_online.csv"
 
 
-begin_index = 0
-end_index = 50   # 🔴 dejamos 50 para pruebas
+url_limit = 50   # 🔴 dejamos 50 para pruebas (None = lista completa)
 
+# Descartar URLs cuyo host ya ha salido antes (filtro de Bloom, url_source.py)
+dedup_hosts = True
 
-# -----------------------------
-# CARGA ROBUSTA DE URLs
-# -----------------------------
-
-df = pd.read_csv(url_filename, header=None)
+# Recolección por shards (sharded_collection.py): cada shard tiene su CSV y
+# su checkpoint en run_dir y al final se unen en output_csv
+num_shards = 4
+run_dir = "collection_run"
+output_csv = "structured_data_phishing.csv"
+label = 1   # 1 = phishing, 0 = legítimo
 
-# CASO PHISHING (tiene columna 'url')
-if "url" in df.columns:
-    url_list = df["url"].astype(str).tolist()
+# "soup" (BeautifulSoup) o "stream" (tokenizador sin árbol)
+parser_backend = "soup"
 
-# CASO LEGÍTIMOS (top-1m.csv → dominio en columna 1)
-else:
-    url_list = df.iloc[:, 1].astype(str).tolist()
+# "async": recolector concurrente (async_collector.py) | "sync": bucle original
+# "pipeline": etapas con colas acotadas, hilos de descarga y pool de
+# extracción (pipeline.py)
+collector_engine = "async"
 
-collection_list = url_list[begin_index:end_index]
+# Máximo de bytes leídos por página (fetcher.py); el resto no se descarga
+max_page_bytes = 1024 * 1024
 
+# Carpeta del archivo de HTML (html_archive.py); None para no guardar nada
+archive_dir = "html_archive"
 
-def normalize_url(url):
-    if url.startswith("http://") or url.startswith("https://"):
-        return url
-    return "http://" + url
+# Saltar los clones de páginas ya recogidas (near_duplicates.py): no se
+# extraen ni se archivan, sólo se apunta la URL original
+near_duplicates = True
 
-
-collection_list = [normalize_url(url) for url in collection_list]
+# Caché de características por hash del HTML (feature_cache.py); None: sin caché
+feature_cache_path = feature_cache.CACHE_PATH
 
 
 # -----------------------------
 # CREACIÓN DE DATOS ESTRUCTURADOS
 # -----------------------------
 
-def create_structured_data(url_list):
+def create_structured_data(url_list, backend=parser_backend, archive=None, dedup=None, cache=None):
+    # dedup: near_duplicates.NearDuplicateIndex opcional, compartido entre lotes
+    # cache: feature_cache.FeatureCache opcional
+    # Los pasos de cada página están en collector_steps.py
     data_list = []
+    session = re.Session()
 
     for i, url in enumerate(url_list):
         try:
-            response = re.get(url, verify=False, timeout=4)
-
-            if response.status_code != 200:
-                print(i, "HTTP error:", url)
-                continue
-
-            soup = BeautifulSoup(response.content, "html.parser")
-            vector = fe.create_vector(soup)
-            vector.append(url)
-            data_list.append(vector)
-
+            if dedup is None and cache is None:
+                page = fetcher.fetch_page(url, session=session, backend=backend,
+                                          max_bytes=max_page_bytes, keep_body=archive is not None)
+            else:
+                # Hace falta el cuerpo antes de extraer: para saber si es un
+                # clon y para buscarlo en la caché
+                page = fetcher.fetch_body(url, session=session, max_bytes=max_page_bytes)
+                if dedup is not None and page.status == 200:
+                    with inst.timer("collector.signature"):
+                        signature = nd.signature(page.body)
+                    if steps.is_duplicate(dedup, i, url, signature):
+                        continue
         except re.exceptions.RequestException as e:
-            print(i, "-->", e)
+            steps.failed(i, e)
+            continue
+
+        if not steps.keep_page(i, url, page.status, page.headers, page.body, archive):
+            continue
+        sha, known, missing = steps.lookup(cache, page.body)
+        values = page.vector
+        if values is None:
+            values = fe.create_vector(page.body, backend=backend, features=missing,
+                                      encoding=page.encoding) if missing else []
+        data_list.append(steps.finish(url, sha, known, missing, values, cache))
 
     return data_list
 
 
-data = create_structured_data(collection_list)
-
-if len(data) == 0:
-    print("⚠️ No data collected.")
-    exit()
-
-
-columns = [
-    "has_title",
-    "has_input",
-    "has_button",
-    "has_image",
-    "has_submit",
-    "has_link",
-    "has_password",
-    "has_email_input",
-    "has_hidden_element",
-    "has_audio",
-    "has_video",
-    "number_of_inputs",
-    "number_of_buttons",
-    "number_of_images",
-    "number_of_option",
-    "number_of_list",
-    "number_of_TH",
-    "number_of_TR",
-    "number_of_href",
-    "number_of_paragraph",
-    "number_of_script",
-    "length_of_title",
-    "URL",
-]
-
-df_out = pd.DataFrame(data, columns=columns)
+if __name__ == "__main__":
+    import sharded_collection as sc
 
-# -----------------------------
-# ETIQUETADO
-# -----------------------------
+    failed = sc.run_local(url_filename, num_shards, run_dir, url_limit)
+    if failed:
+        exit()
+
+    # -----------------------------
+    # UNIÓN Y ETIQUETADO
+    # -----------------------------
+
+    df_out = sc.merge_shards(run_dir, num_shards, output_csv, label)
 
-df_out["label"] = 1
-df_out.to_csv("structured_data_phishing.csv", index=False)
+    if len(df_out) == 0:
+        print("⚠️ No data collected.")
+        exit()
 
+    print(f"✅ {output_csv} created successfully")
+    duplicates_csv = sc.duplicates_path(output_csv)
+    if os.path.exists(duplicates_csv):
+        print(f"Near-duplicates skipped: {sum(1 for _ in open(duplicates_csv)) - 1} (see {duplicates_csv})")
 
-print("✅ structured_data_legitimate.csv created successfully")
+    # Métricas de todos los shards (sólo con PHISHING_METRICS=1)
+    if inst.ENABLED:
+        sc.merge_metrics(run_dir, num_shards)
+        print("Metrics:", inst.export(sc.metrics_path(run_dir)))
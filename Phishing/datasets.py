@@ -0,0 +1,110 @@
+import os
+import pandas as pd
+import feature_registry as fr
+import compact_dataset as cd
+
+# Carga de los datasets estructurados, sin dependencias de sklearn: la usan
+# tanto machine_learning.py (entrenamiento) como app.py (arranque rápido).
+
+
+LEGITIMATE_CSV = 'structured_data_legitimate.csv'
+PHISHING_CSV = 'structured_data_phishing.csv'
+
+
+def compact_frame(data, urls=True):
+    # Las características salen de feature_matrix como un único bloque
+    # float32, sin copiar cada columna del mmap a un DataFrame de varios tipos
+    df = pd.DataFrame(data.feature_matrix(), columns=fr.FEATURE_NAMES, copy=False)
+    if urls and data.meta["urls"]:
+        df["URL"] = data.urls()
+    if data.label is not None:
+        df["label"] = data.label
+    return df
+
+
+def read_dataset(csv_path, urls=True):
+    # Si existe la versión compacta (compact_dataset.py) se abre por mmap; si
+    # el CSV ha cambiado desde la conversión se rehace antes
+    compact = cd.compact_path(csv_path)
+    if not os.path.exists(os.path.join(compact, "meta.json")):
+        return pd.read_csv(csv_path)
+    if not cd.is_fresh(csv_path, compact):
+        try:
+            cd.convert_csv(csv_path, compact)
+        except OSError as e:
+            print(f"⚠️ {compact} is out of date and could not be rebuilt ({e}): reading {csv_path}")
+            return pd.read_csv(csv_path)
+    return compact_frame(cd.load_dataset(compact), urls)
+
+
+# ----- Step 1: Cargar los datasets ----- #
+def load_datasets(urls=True):
+    legitimate_df = read_dataset(LEGITIMATE_CSV, urls)
+    phishing_df = read_dataset(PHISHING_CSV, urls)
+
+    # Falla en cuanto el CSV no corresponde al esquema de características actual
+    fr.check_columns(legitimate_df.columns)
+    fr.check_columns(phishing_df.columns)
+    return legitimate_df, phishing_df
+
+
+# ----- Step 2: Combinar y limpiar datos ----- #
+def prepare_data(legitimate_df, phishing_df):
+    df = pd.concat([legitimate_df, phishing_df], axis=0)
+    df = df.sample(frac=1).reset_index(drop=True)
+    df = df.drop('URL', axis=1, errors='ignore')
+    df = df.drop_duplicates()
+
+    X = df[fr.FEATURE_NAMES]
+    Y = df['label']
+    return df, X, Y
+
+
+# ----- Lotes nuevos (incremental_training.py) ----- #
+def append_batch(batch):
+    # Añade las filas (con columna label) al CSV de su clase y rehace la
+    # copia compacta si existe, para que no quede desactualizada
+    for label, rows in batch.groupby("label"):
+        csv_path = PHISHING_CSV if label == 1 else LEGITIMATE_CSV
+        columns = list(pd.read_csv(csv_path, nrows=0).columns)
+        rows.reindex(columns=columns).to_csv(csv_path, mode="a", header=False, index=False)
+        if os.path.exists(os.path.join(cd.compact_path(csv_path), "meta.json")):
+            cd.convert_csv(csv_path)
+
+
+# ----- Bloque disperso (sparse_features.py, machine_learning.py --hashed) ----- #
+def prepare_hashed_data(legitimate_df, phishing_df):
+    # Como prepare_data, pero devuelve también las filas del bloque disperso
+    # de cada CSV alineadas por URL. Cada CSV tiene que tener su bloque y
+    # cubrir todas sus filas: unas filas sin tokens y otras con ellos
+    # delatarían la etiqueta. Necesita la columna URL: load_datasets(urls=True)
+    import numpy as np
+    from scipy import sparse
+    import sparse_features as sf
+
+    blocks = []
+    for rows, csv_path in ((legitimate_df, LEGITIMATE_CSV), (phishing_df, PHISHING_CSV)):
+        path = sf.block_path(csv_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No hashed feature block for {csv_path}: rebuild it with "
+                                    "html_archive.rebuild_structured_data(..., hashed=True)")
+        urls, matrix = sf.load_block(path)
+        block, n = sf.align(urls, matrix, rows['URL'])
+        if n < len(rows):
+            raise ValueError(f"{path} covers only {n} of the {len(rows)} rows of {csv_path}: "
+                             "rebuild it with html_archive.rebuild_structured_data(..., hashed=True)")
+        blocks.append(block)
+
+    df = pd.concat([legitimate_df, phishing_df], axis=0, ignore_index=True)
+    hashed = sparse.vstack(blocks).tocsr()
+    order = np.random.permutation(len(df))
+    df, hashed = df.iloc[order].reset_index(drop=True), hashed[order]
+    # Los duplicados se buscan con la URL: dos páginas con el mismo vector
+    # denso pueden tener textos distintos
+    keep = ~df.duplicated().to_numpy()
+    df = df[keep].drop('URL', axis=1).reset_index(drop=True)
+    hashed = hashed[keep]
+
+    X = df[fr.FEATURE_NAMES]
+    Y = df['label']
+    return df, X, Y, hashed
@@ -0,0 +1,144 @@
+# -----------------------------
+# Caché persistente de vectores de características
+# -----------------------------
+# Volver a extraer un corpus (feature_extraction.py, html_archive.py) o
+# recolectar páginas ya vistas reparsea cada HTML aunque no hayan cambiado
+# ni la página ni el código de las características. Aquí se guardan los
+# valores ya calculados en SQLite:
+#
+#   features (sha, feature, value)  sha: sha256 del HTML
+#                                   feature: nombre@versión:tipo de una
+#                                   característica (feature_registry.feature_version)
+#
+# Se guarda una fila por característica y no por vector: si cambia una sola
+# característica (su entrada en FEATURE_VERSIONS), sólo se recalcula esa
+# columna en todo el corpus; las demás siguen saliendo de la caché.
+#
+#   python feature_cache.py stats | prune
+
+import sys
+import sqlite3
+import threading
+import feature_extraction as fe
+import feature_registry as fr
+import instrumentation as inst
+import verdict_cache as vc
+
+
+CACHE_PATH = "feature_cache.sqlite"
+LOOKUP_BATCH = 500   # shas por consulta (límite de parámetros de SQLite)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS features (
+    sha TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (sha, feature)
+) WITHOUT ROWID;
+"""
+
+
+class FeatureCache:
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        # Varios procesos (shards, pool) pueden escribir a la vez: WAL + espera
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def lookup_many(self, shas, names=None):
+        # {sha: {característica: valor}} con las columnas encontradas
+        keys = {fr.feature_version(name): name for name in (names or fr.FEATURE_NAMES)}
+        shas = list(dict.fromkeys(shas))
+        found = {}
+        with self.lock:
+            for start in range(0, len(shas), LOOKUP_BATCH):
+                batch = shas[start:start + LOOKUP_BATCH]
+                query = f"SELECT sha, feature, value FROM features WHERE sha IN ({','.join('?' * len(batch))})"
+                for sha, key, value in self.db.execute(query, batch):
+                    if key in keys:
+                        found.setdefault(sha, {})[keys[key]] = value
+        return found
+
+    def store_many(self, items):
+        # items: [(sha, {característica: valor})]
+        rows = [(sha, fr.feature_version(name), int(value))
+                for sha, values in items for name, value in values.items()]
+        if rows:
+            with self.lock:
+                self.db.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?)", rows)
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            pages = self.db.execute("SELECT COUNT(DISTINCT sha) FROM features").fetchone()[0]
+            counts = self.db.execute("SELECT feature, COUNT(*) FROM features GROUP BY feature").fetchall()
+        current = {fr.feature_version(name) for name in fr.FEATURE_NAMES}
+        return {
+            "pages": pages,
+            "values": sum(n for _, n in counts),
+            "stale_features": sorted(key for key, _ in counts if key not in current),
+        }
+
+    def prune(self):
+        # Borra los valores de versiones de características que ya no existen
+        current = [fr.feature_version(name) for name in fr.FEATURE_NAMES]
+        with self.lock:
+            deleted = self.db.execute(
+                f"DELETE FROM features WHERE feature NOT IN ({','.join('?' * len(current))})", current
+            ).rowcount
+            self.db.commit()
+        return deleted
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def missing_features(known, names):
+    return [name for name in names if name not in known]
+
+
+def cached_vectors(cache, bodies, backend=fe.DEFAULT_BACKEND, features=None, encodings=None, shas=None):
+    # Vectores de varias páginas: una consulta para todas y sólo se extraen
+    # las columnas que faltan
+    names = list(features or fr.FEATURE_NAMES)
+    shas = shas or [vc.content_hash(body) for body in bodies]
+    encodings = encodings or [None] * len(bodies)
+    with inst.timer("feature_cache.lookup"):
+        found = cache.lookup_many(shas, names)
+
+    vectors, new = [], []
+    for sha, body, encoding in zip(shas, bodies, encodings):
+        known = found.setdefault(sha, {})
+        missing = missing_features(known, names)
+        inst.incr("feature_cache.hit_values", len(names) - len(missing))
+        if missing:
+            inst.incr("feature_cache.miss_values", len(missing))
+            computed = dict(zip(missing, fe.create_vector(body, backend=backend, features=missing,
+                                                          encoding=encoding)))
+            known.update(computed)
+            new.append((sha, computed))
+        vectors.append([known[name] for name in names])
+    cache.store_many(new)
+    return vectors
+
+
+def cached_vector(cache, body, backend=fe.DEFAULT_BACKEND, features=None, encoding=None, sha=None):
+    return cached_vectors(cache, [body], backend, features, [encoding], [sha] if sha else None)[0]
+
+
+if __name__ == "__main__":
+    path = sys.argv[2] if len(sys.argv) > 2 else CACHE_PATH
+    with FeatureCache(path) as cache:
+        if len(sys.argv) > 1 and sys.argv[1] == "prune":
+            print(f"{cache.prune()} stale values deleted")
+        print(cache.stats())
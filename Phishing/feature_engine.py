@@ -0,0 +1,339 @@
+import os
+import codecs
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.dammit import EncodingDetector
+import feature_registry as fr
+import instrumentation as inst
+
+# ===================================
+# Motor de características en una sola pasada
+# ===================================
+# Las funciones de features.py hacen un soup.find_all(...) cada una
+# (<input> se recorre seis veces). Aquí se recorre el árbol una única vez
+# y se rellenan todos los contadores; las 22 características se derivan
+# después de esos contadores (ver feature_registry.py). Si sólo se piden
+# algunas características, sólo se visitan las etiquetas que necesitan.
+# Con tokens (sparse_features.HashedTokens) la misma pasada recoge también
+# el bloque disperso de texto y atributos.
+
+# Contadores que llenan los escáneres (el "title" se guarda aparte)
+COUNTERS = [counter for counter in fr.COUNTER_TAGS if counter != "title"]
+
+SIMPLE_TAGS = {"button", "image", "audio", "video", "option", "li", "th", "tr", "p", "script"}
+ATTR_TAGS = {"input", "link", "meta"}
+
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 64 * 1024   # bytes iniciales en los que se busca el charset declarado
+# Códecs que quitan el BOM al decodificar (BeautifulSoup también lo quita)
+BOM_CODECS = {"utf-8": "utf-8-sig", "utf-16le": "utf-16", "utf-16be": "utf-16",
+              "utf-32le": "utf-32", "utf-32be": "utf-32"}
+
+# Texto que no se tokeniza para el bloque disperso (como Script/Stylesheet en
+# bs4); dentro de <template> tampoco, a cualquier profundidad (TemplateString)
+SKIP_TEXT_TAGS = {"script", "style"}
+
+
+def new_counts():
+    counts = dict.fromkeys(COUNTERS, 0)
+    counts["title"] = None
+    return counts
+
+
+def count_input(counts, attrs):
+    # attrs: cualquier objeto con .get() (dict de atributos del tag)
+    input_type = attrs.get("type")
+    name = attrs.get("name")
+    tag_id = attrs.get("id")
+    counts["input"] += 1
+    if input_type == "submit":
+        counts["input_submit"] += 1
+    if input_type == "password" or name == "password" or tag_id == "password":
+        counts["input_password"] += 1
+    if input_type == "email" or name == "email" or tag_id == "email":
+        counts["input_email"] += 1
+    if input_type == "hidden":
+        counts["input_hidden"] += 1
+
+
+def count_tag(counts, name, attrs):
+    if name in SIMPLE_TAGS:
+        counts[name] += 1
+    elif name == "input":
+        count_input(counts, attrs)
+    elif name == "link":
+        counts["link"] += 1
+        if attrs.get("href"):
+            counts["link_href"] += 1
+    elif name == "meta":
+        if attrs.get("type") == "image" or attrs.get("name") == "image":
+            counts["meta_image"] += 1
+
+
+def scan_soup(soup, tags=None, tokens=None):
+    if tokens is not None:
+        return scan_soup_tokens(soup, tokens)
+    counts = new_counts()
+    with inst.timer("extract.scan_soup"):
+        for tag in soup.find_all(list(tags) if tags is not None else True):
+            name = tag.name
+            if name == "title":
+                # soup.title es el primer <title> del documento
+                if counts["title"] is None:
+                    counts["title"] = tag.text
+                continue
+            count_tag(counts, name, tag.attrs)
+    return counts
+
+
+def scan_soup_tokens(soup, tokens):
+    # Como scan_soup, pero recorre también los textos (descendants en vez de
+    # find_all). Sólo NavigableString: comentarios, <script>, <style> y
+    # <template> tienen sus propios tipos y no cuentan como texto
+    counts = new_counts()
+    with inst.timer("extract.scan_soup"):
+        for node in soup.descendants:
+            if isinstance(node, Tag):
+                name = node.name
+                tokens.add_tag(name, node.attrs)
+                if name == "title":
+                    if counts["title"] is None:
+                        counts["title"] = node.text
+                    continue
+                count_tag(counts, name, node.attrs)
+            elif type(node) is NavigableString:
+                tokens.add_text("title" if node.parent.name == "title" else "body", node)
+    return counts
+
+
+def vector_from_counts(counts, features=None):
+    if inst.ENABLED:
+        return timed_vector_from_counts(counts, features)
+    return [feature.compute(counts) for feature in fr.resolve_features(features)]
+
+
+def timed_vector_from_counts(counts, features=None):
+    # Mismo resultado, con un temporizador por característica
+    vector = []
+    for feature in fr.resolve_features(features):
+        with inst.timer("feature." + feature.name):
+            vector.append(feature.compute(counts))
+    return vector
+
+
+def extract_vector(soup, features=None, tokens=None):
+    tags = fr.required_tags(features) if features is not None else None
+    return vector_from_counts(scan_soup(soup, tags, tokens), features)
+
+
+# ===================================
+# Backend en streaming (sin árbol)
+# ===================================
+# Usa el mismo tokenizador que "html.parser" de BeautifulSoup, pero sólo
+# actualiza los contadores en cada evento; nunca se construye el DOM.
+
+class StreamScanner(HTMLParser):
+
+    def __init__(self, tags=None, tokens=None):
+        super().__init__(convert_charrefs=True)
+        self.counts = new_counts()
+        self.tags = tags
+        self.tokens = tokens
+        self._title_parts = None
+        self._in_title = False
+        # Texto pendiente de tokenizar y su espacio de nombres (None: se ignora)
+        self._text = []
+        self._text_namespace = "body"
+        self._template_depth = 0
+
+    def flush_text(self):
+        if self._text:
+            if self._text_namespace is not None:
+                self.tokens.add_text(self._text_namespace, "".join(self._text))
+            self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.tokens is not None:
+            # Antes del filtro de etiquetas: el bloque disperso las necesita todas
+            self.flush_text()
+            self.tokens.add_tag(tag, dict(attrs))
+            if tag == "template":
+                self._template_depth += 1
+            if self._template_depth or tag in SKIP_TEXT_TAGS:
+                self._text_namespace = None
+            elif tag == "title":
+                self._text_namespace = "title"
+            else:
+                self._text_namespace = "body"
+        if self.tags is not None and tag not in self.tags:
+            return
+        if tag in SIMPLE_TAGS:
+            self.counts[tag] += 1
+        elif tag in ATTR_TAGS:
+            count_tag(self.counts, tag, dict(attrs))
+        elif tag == "title" and self._title_parts is None:
+            self._title_parts = []
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if self.tokens is not None:
+            self.flush_text()
+            if tag == "template" and self._template_depth:
+                self._template_depth -= 1
+            self._text_namespace = None if self._template_depth else "body"
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+        if self.tokens is not None:
+            self._text.append(data)
+
+    def finish(self):
+        self.close()
+        if self.tokens is not None:
+            self.flush_text()
+        if self._title_parts is not None:
+            self.counts["title"] = "".join(self._title_parts)
+        return self.counts
+
+
+def sniff_encoding(head):
+    # Sin charset HTTP, como BeautifulSoup: BOM o <meta charset> / http-equiv
+    # al principio del documento. None si no hay ninguno válido
+    _, bom = EncodingDetector.strip_byte_order_mark(head)
+    if bom:
+        return BOM_CODECS.get(bom, bom)
+    declared = EncodingDetector.find_declared_encoding(head, is_html=True, search_entire_document=True)
+    if declared:
+        try:
+            codecs.lookup(declared)
+            return declared
+        except LookupError:
+            return None
+    return None
+
+
+def new_decoder(encoding, head):
+    return codecs.getincrementaldecoder(encoding or sniff_encoding(head) or "utf-8")(errors="replace")
+
+
+def iter_text_chunks(page, encoding=None):
+    # page: str, bytes, fichero abierto o iterable de trozos (str o bytes)
+    # encoding: charset HTTP; si falta se busca en los primeros SNIFF_BYTES
+    if isinstance(page, (str, bytes)):
+        chunks = (page[i:i + CHUNK_SIZE] for i in range(0, len(page), CHUNK_SIZE))
+    elif hasattr(page, "read"):
+        chunks = iter(lambda: page.read(CHUNK_SIZE), page.read(0))
+    else:
+        chunks = page
+
+    decoder = None
+    head, head_size = [], 0   # trozos retenidos hasta poder elegir el charset
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                head.append(chunk)
+                head_size += len(chunk)
+                if encoding is None and head_size < SNIFF_BYTES:
+                    continue
+                chunk, head = b"".join(head), []
+                decoder = new_decoder(encoding, chunk)
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if head:
+        # Documento más corto que SNIFF_BYTES
+        data = b"".join(head)
+        decoder = new_decoder(encoding, data)
+        text = decoder.decode(data)
+        if text:
+            yield text
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def scan_stream(page, encoding=None, tags=None, tokens=None):
+    # Si page es un cuerpo HTTP en streaming, incluye también la descarga
+    scanner = StreamScanner(tags, tokens)
+    with inst.timer("parse.stream"):
+        for chunk in iter_text_chunks(page, encoding):
+            scanner.feed(chunk)
+        return scanner.finish()
+
+
+def stream_vector(page, encoding=None, features=None, tokens=None):
+    tags = fr.required_tags(features) if features is not None else None
+    return vector_from_counts(scan_stream(page, encoding, tags, tokens), features)
+
+
+# ===================================
+# Pruebas de paridad con features.py
+# ===================================
+
+ENCODED_PAGES = {
+    "gbk (meta charset)": (
+        '<html><head><meta charset="gbk"><title>中国工商银行网上银行登录</title></head>'
+        '<body><form><input type="password" name="password"></form>'
+        + "<p>请输入您的账户信息</p>" * 400 + "</body></html>"
+    ).encode("gbk"),
+    "shift_jis (http-equiv)": (
+        '<html><head><meta http-equiv="Content-Type" content="text/html; charset=shift_jis">'
+        "<title>三菱ＵＦＪ銀行ログイン画面</title></head><body><input type=\"email\">"
+        + "<li>お客様情報の確認</li>" * 400 + "</body></html>"
+    ).encode("shift_jis"),
+    "utf-8 (BOM)": "\ufeff<html><head><title>Iniciar sesión</title></head><body></body></html>".encode("utf-8"),
+}
+
+
+def check_parity(dataset_dir="mini_dataset"):
+    import feature_extraction as fe
+    import sparse_features as sf
+
+    mismatches = []
+    for filename in sorted(os.listdir(dataset_dir)):
+        if not filename.endswith(".html"):
+            continue
+        # Bytes, como llegan de la red: BeautifulSoup elige el charset
+        with open(os.path.join(dataset_dir, filename), "rb") as f:
+            soup = BeautifulSoup(f, "html.parser")
+        expected = fe.create_vector_reference(soup)
+        for backend in fe.BACKENDS:
+            with open(os.path.join(dataset_dir, filename), "rb") as f:
+                page = soup if backend == "soup" else f
+                got = fe.create_vector(page, backend=backend)
+            if got != expected:
+                mismatches.append((filename, backend, expected, got))
+
+        # Bloque disperso (sparse_features.py): mismas columnas en ambos backends
+        hashed = {}
+        for backend in fe.BACKENDS:
+            tokens = sf.HashedTokens()
+            with open(os.path.join(dataset_dir, filename), "rb") as f:
+                fe.create_vector(soup if backend == "soup" else f, backend=backend, tokens=tokens)
+            hashed[backend] = tokens.counts
+        if hashed["soup"] != hashed["stream"]:
+            mismatches.append((filename, "hashed", len(hashed["soup"]), len(hashed["stream"])))
+
+    # Páginas no UTF-8 sin charset HTTP: el charset sólo está en el HTML
+    for name, page in ENCODED_PAGES.items():
+        expected = fe.create_vector_reference(BeautifulSoup(page, "html.parser"))
+        chunks = [page[i:i + 1024] for i in range(0, len(page), 1024)]
+        for backend, body in (("soup", page), ("stream", page), ("stream-chunks", chunks)):
+            got = fe.create_vector(body, backend=backend.split("-")[0])
+            if got != expected:
+                mismatches.append((name, backend, expected, got))
+    return mismatches
+
+
+if __name__ == "__main__":
+    mismatches = check_parity()
+    for filename, backend, expected, got in mismatches:
+        print(filename, backend, "-->", "expected", expected, "got", got)
+    if mismatches:
+        raise SystemExit(1)
+    print("Single-pass and stream backends match features.py (and each other's hashed block) "
+          "on mini_dataset and the non-UTF-8 pages")
@@ -1,10 +1,44 @@
 import os
-import pandas as pd
+import csv
+from multiprocessing import Pool
 from bs4 import BeautifulSoup
 from features import *
+from feature_engine import extract_vector, stream_vector
+from feature_registry import FEATURE_NAMES
+import instrumentation as inst
 
+# "soup":   BeautifulSoup + una sola pasada sobre el árbol
+# "stream": tokenizador en streaming, sin construir el árbol
+BACKENDS = ("soup", "stream")
+DEFAULT_BACKEND = "soup"
 
-def create_vector(soup):
+
+def create_vector(page, backend=DEFAULT_BACKEND, features=None, encoding=None, tokens=None):
+    # page: objeto BeautifulSoup, o el HTML (str, bytes, fichero, trozos)
+    # features: subconjunto de FEATURE_NAMES (p.ej. las de un modelo);
+    #           None calcula las 22 en el orden del esquema
+    # encoding: charset de los bytes para "stream" (BeautifulSoup lo detecta solo)
+    # tokens: sparse_features.HashedTokens que se rellena en la misma pasada
+    if backend == "stream":
+        if isinstance(page, BeautifulSoup):
+            return extract_vector(page, features, tokens)
+        return stream_vector(page, encoding, features, tokens)
+    if backend != "soup":
+        raise ValueError(f"Unknown backend: {backend}")
+    if not isinstance(page, (BeautifulSoup, str, bytes)) and not hasattr(page, "read"):
+        # Trozos (p.ej. un cuerpo HTTP en streaming): el árbol necesita el documento entero
+        with inst.timer("fetch.body"):
+            chunks = list(page)
+        page = b"".join(chunks) if chunks and isinstance(chunks[0], bytes) else "".join(chunks)
+    if not isinstance(page, BeautifulSoup):
+        with inst.timer("parse.soup"):
+            page = BeautifulSoup(page, "html.parser")
+    return extract_vector(page, features, tokens)
+
+
+# Versión original: una llamada a features.py por característica.
+# Se mantiene como referencia para las pruebas de paridad.
+def create_vector_reference(soup):
     return [
         has_title(soup),
         has_input(soup),
@@ -31,49 +65,141 @@ def create_vector(soup):
     ]
 
 
+# -----------------------------------
+# Extracción por lotes (paralela y reanudable)
+# -----------------------------------
+# Los ficheros se reparten entre todos los núcleos, las filas se escriben
+# en el CSV por bloques y, tras cada bloque, se anota en el checkpoint qué
+# ficheros están hechos y hasta qué byte es válido el CSV. Si el proceso
+# muere, la siguiente ejecución recorta el CSV a ese byte y sigue.
+# Con cache_path, cada proceso consulta antes la caché de feature_cache.py
+# (una consulta por grupo de JOB_FILES ficheros).
+
+CHUNK_ROWS = 500
+JOB_FILES = 16
+
+_cache = None
+
+
+def init_worker(cache_path):
+    global _cache
+    if cache_path:
+        import feature_cache
+        _cache = feature_cache.FeatureCache(cache_path)
+
+
+def read_html(filepath):
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(filepath, "-->", e)
+        return None
+
+
+def extract_files(job):
+    filepaths, backend = job
+    pages = [(os.path.basename(path), read_html(path)) for path in filepaths]
+    readable = [(filename, html) for filename, html in pages if html is not None]
+    if _cache is not None:
+        import feature_cache
+        vectors = feature_cache.cached_vectors(_cache, [html for _, html in readable], backend)
+    else:
+        vectors = [create_vector(html, backend=backend) for _, html in readable]
+    results = dict(zip([filename for filename, _ in readable], vectors))
+    return [(filename, results.get(filename)) for filename, _ in pages]
+
+
+def iter_jobs(dataset_dir, done, backend, size=JOB_FILES):
+    paths = []
+    for entry in os.scandir(dataset_dir):
+        if entry.name.endswith(".html") and entry.name not in done:
+            paths.append(entry.path)
+            if len(paths) >= size:
+                yield paths, backend
+                paths = []
+    if paths:
+        yield paths, backend
+
+
+def load_checkpoint(checkpoint_path):
+    # (ficheros hechos, bytes válidos del CSV, bytes válidos del checkpoint)
+    done, pending, offset, valid = set(), [], 0, 0
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "rb") as f:
+            position = 0
+            for raw in f:
+                position += len(raw)
+                line = raw.decode("utf-8").rstrip("\n")
+                if line.startswith("#offset ") and raw.endswith(b"\n"):
+                    # sólo cuentan los ficheros confirmados por un offset
+                    offset = int(line.split()[1])
+                    done.update(pending)
+                    pending = []
+                    valid = position
+                elif line:
+                    pending.append(line)
+    return done, offset, valid
+
+
+def commit_chunk(out, ckpt, filenames):
+    out.flush()
+    os.fsync(out.fileno())
+    offset = os.fstat(out.fileno()).st_size
+    for filename in filenames:
+        ckpt.write(filename + "\n")
+    ckpt.write(f"#offset {offset}\n")
+    ckpt.flush()
+    os.fsync(ckpt.fileno())
+
+
+def extract_directory(dataset_dir, output_csv, backend=DEFAULT_BACKEND,
+                      workers=None, chunk_rows=CHUNK_ROWS, checkpoint_path=None, cache_path=None):
+    checkpoint_path = checkpoint_path or output_csv + ".ckpt"
+    done, offset, valid = load_checkpoint(checkpoint_path)
+    if offset > 0:
+        print(f"Resuming: {len(done)} files already done")
+        os.truncate(output_csv, offset)
+        # Los nombres escritos tras el último offset no llegaron a confirmarse:
+        # si se quedaran, el próximo offset los daría por hechos sin sus filas
+        os.truncate(checkpoint_path, valid)
+    else:
+        open(output_csv, "w").close()
+        open(checkpoint_path, "w").close()
+
+    processed = 0
+    with open(output_csv, "a", newline="", encoding="utf-8") as out, \
+            open(checkpoint_path, "a", encoding="utf-8") as ckpt, \
+            Pool(workers, initializer=init_worker, initargs=(cache_path,)) as pool:
+        writer = csv.writer(out)
+        if offset == 0:
+            writer.writerow(FEATURE_NAMES + ["filename"])
+            commit_chunk(out, ckpt, [])
+
+        filenames = []
+        for results in pool.imap_unordered(extract_files, iter_jobs(dataset_dir, done, backend)):
+            for filename, vector in results:
+                if vector is not None:
+                    writer.writerow(vector + [filename])
+                filenames.append(filename)
+            if len(filenames) >= chunk_rows:
+                commit_chunk(out, ckpt, filenames)
+                processed += len(filenames)
+                filenames = []
+        commit_chunk(out, ckpt, filenames)
+        processed += len(filenames)
+
+    # Terminado: la próxima ejecución vuelve a empezar desde cero
+    os.remove(checkpoint_path)
+    return processed
+
+
 if __name__ == "__main__":
 
     DATASET_DIR = "mini_dataset"
-    dataset_features = []
-
-    for filename in os.listdir(DATASET_DIR):
-        if filename.endswith(".html"):
-            filepath = os.path.join(DATASET_DIR, filename)
-
-            with open(filepath, "r", encoding="utf-8") as f:
-                soup = BeautifulSoup(f, "html.parser")
-
-            vector = create_vector(soup)
-            vector.append(filename)
-            dataset_features.append(vector)
-
-    columns = [
-        "has_title",
-        "has_input",
-        "has_button",
-        "has_image",
-        "has_submit",
-        "has_link",
-        "has_password",
-        "has_email_input",
-        "has_hidden_element",
-        "has_audio",
-        "has_video",
-        "number_of_inputs",
-        "number_of_buttons",
-        "number_of_images",
-        "number_of_option",
-        "number_of_list",
-        "number_of_TH",
-        "number_of_TR",
-        "number_of_href",
-        "number_of_paragraph",
-        "number_of_script",
-        "length_of_title",
-        "filename",
-    ]
+    OUTPUT_CSV = "features_dataset.csv"
+    CACHE_PATH = "feature_cache.sqlite"   # None: sin caché
 
-    df = pd.DataFrame(dataset_features, columns=columns)
-    df.to_csv("features_dataset.csv", index=False)
+    extract_directory(DATASET_DIR, OUTPUT_CSV, cache_path=CACHE_PATH)
 
     print("Feature extraction completed. CSV saved as features_dataset.csv")
@@ -0,0 +1,170 @@
+import hashlib
+import json
+from collections import namedtuple
+
+# ===================================
+# Registro declarativo de características
+# ===================================
+# Única fuente de verdad para el nombre, el orden, el tipo y las
+# dependencias (contadores de feature_engine.py) de cada característica.
+# feature_extraction.py, data_collector.py y machine_learning.py leen las
+# columnas de aquí en lugar de copiarlas a mano.
+
+# Subir la versión cada vez que cambie la definición de una característica
+SCHEMA_VERSION = 1
+
+# Columnas de los CSV que no son características
+META_COLUMNS = ("URL", "label", "filename")
+
+Feature = namedtuple("Feature", ["name", "dtype", "depends", "compute"])
+
+# Etiqueta (tag) HTML que alimenta cada contador
+COUNTER_TAGS = {
+    "title": "title",
+    "input": "input",
+    "input_submit": "input",
+    "input_password": "input",
+    "input_email": "input",
+    "input_hidden": "input",
+    "button": "button",
+    "image": "image",
+    "meta_image": "meta",
+    "link": "link",
+    "link_href": "link",
+    "audio": "audio",
+    "video": "video",
+    "option": "option",
+    "li": "li",
+    "th": "th",
+    "tr": "tr",
+    "p": "p",
+    "script": "script",
+}
+
+
+def title_length(counts):
+    title = counts["title"]
+    return len(title.strip()) if title else 0
+
+
+def flag(counter):
+    return lambda counts: 1 if counts[counter] > 0 else 0
+
+
+def count(*counters):
+    return lambda counts: sum(counts[c] for c in counters)
+
+
+FEATURES = [
+    # ----- 6.6.3 Características Binarias ----- #
+    Feature("has_title", "bool", ("title",), lambda counts: 1 if title_length(counts) > 0 else 0),
+    Feature("has_input", "bool", ("input",), flag("input")),
+    Feature("has_button", "bool", ("button",), flag("button")),
+    Feature("has_image", "bool", ("image",), flag("image")),
+    Feature("has_submit", "bool", ("input_submit",), flag("input_submit")),
+    Feature("has_link", "bool", ("link",), flag("link")),
+    Feature("has_password", "bool", ("input_password",), flag("input_password")),
+    Feature("has_email_input", "bool", ("input_email",), flag("input_email")),
+    Feature("has_hidden_element", "bool", ("input_hidden",), flag("input_hidden")),
+    Feature("has_audio", "bool", ("audio",), flag("audio")),
+    Feature("has_video", "bool", ("video",), flag("video")),
+    # ----- 6.6.4 Características Cuantitativas ----- #
+    Feature("number_of_inputs", "int", ("input",), count("input")),
+    Feature("number_of_buttons", "int", ("button",), count("button")),
+    Feature("number_of_images", "int", ("image", "meta_image"), count("image", "meta_image")),
+    Feature("number_of_option", "int", ("option",), count("option")),
+    Feature("number_of_list", "int", ("li",), count("li")),
+    Feature("number_of_TH", "int", ("th",), count("th")),
+    Feature("number_of_TR", "int", ("tr",), count("tr")),
+    Feature("number_of_href", "int", ("link_href",), count("link_href")),
+    Feature("number_of_paragraph", "int", ("p",), count("p")),
+    Feature("number_of_script", "int", ("script",), count("script")),
+    Feature("length_of_title", "int", ("title",), title_length),
+]
+
+FEATURE_NAMES = [feature.name for feature in FEATURES]
+FEATURES_BY_NAME = {feature.name: feature for feature in FEATURES}
+
+# Versión de cada característica por separado (sin entrada = 1). Al cambiar
+# una, subir aquí la suya además de SCHEMA_VERSION: feature_cache.py sólo
+# recalcula las columnas cuya versión ha cambiado
+FEATURE_VERSIONS = {
+    # El backend "stream" decodificaba como UTF-8 las páginas sin charset
+    # HTTP aunque declararan otro en <meta>: los títulos guardados en
+    # feature_cache.py con ese error no se reutilizan
+    "length_of_title": 2,
+}
+
+
+def feature_version(name):
+    feature = FEATURES_BY_NAME[name]
+    return f"{feature.name}@{FEATURE_VERSIONS.get(name, 1)}:{feature.dtype}"
+
+
+# -----------------------------------
+# Subconjuntos de características
+# -----------------------------------
+
+def resolve_features(names=None):
+    if names is None:
+        return FEATURES
+    unknown = [name for name in names if name not in FEATURES_BY_NAME]
+    if unknown:
+        raise ValueError(f"Unknown features (schema v{SCHEMA_VERSION}): {unknown}")
+    return [FEATURES_BY_NAME[name] for name in names]
+
+
+def required_counters(names=None):
+    counters = set()
+    for feature in resolve_features(names):
+        counters.update(feature.depends)
+    return counters
+
+
+def required_tags(names=None):
+    return {COUNTER_TAGS[counter] for counter in required_counters(names)}
+
+
+def model_features(model):
+    # Los modelos de sklearn entrenados con un DataFrame guardan sus columnas
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        names = [str(name) for name in names]
+        resolve_features(names)
+        return names
+    n_features = getattr(model, "n_features_in_", len(FEATURE_NAMES))
+    if n_features != len(FEATURE_NAMES):
+        raise ValueError(
+            f"Model expects {n_features} features without names, "
+            f"schema v{SCHEMA_VERSION} has {len(FEATURE_NAMES)}"
+        )
+    return list(FEATURE_NAMES)
+
+
+# -----------------------------------
+# Esquema versionado
+# -----------------------------------
+
+def schema(names=None):
+    return {
+        "version": SCHEMA_VERSION,
+        "features": [[feature.name, feature.dtype] for feature in resolve_features(names)],
+    }
+
+
+def schema_fingerprint(names=None):
+    payload = json.dumps(schema(names), sort_keys=True).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def check_columns(columns):
+    # Falla en cuanto las columnas de un CSV no coinciden con el esquema
+    feature_columns = [str(c) for c in columns if c not in META_COLUMNS]
+    if feature_columns != FEATURE_NAMES:
+        missing = [name for name in FEATURE_NAMES if name not in feature_columns]
+        extra = [name for name in feature_columns if name not in FEATURES_BY_NAME]
+        raise ValueError(
+            f"Columns do not match feature schema v{SCHEMA_VERSION} "
+            f"(missing={missing}, unknown={extra}, or different order)"
+        )
+    return feature_columns
@@ -0,0 +1,124 @@
+# -----------------------------
+# Descarga acotada y en streaming
+# -----------------------------
+# response.content descarga el cuerpo entero sin mirar tamaño ni tipo.
+# Aquí el cuerpo se lee por trozos (stream=True):
+# - sólo se aceptan los Content-Type de ALLOWED_TYPES
+# - se corta la conexión en cuanto se alcanza MAX_BYTES
+# - los trozos van directamente al extractor, de modo que con el backend
+#   "stream" la página se puntúa con lo leído hasta ese momento (el primer
+#   mega basta) sin guardar el documento en memoria
+
+import codecs
+from collections import namedtuple
+import requests
+import feature_extraction as fe
+import instrumentation as inst
+
+
+MAX_BYTES = 1024 * 1024
+ALLOWED_TYPES = ("text/html", "application/xhtml+xml")
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = 4
+
+Page = namedtuple("Page", ["url", "status", "headers", "vector", "body", "truncated", "encoding"],
+                  defaults=(None,))
+
+
+class ContentRejected(requests.exceptions.RequestException):
+    # Subclase de RequestException: los `except` existentes ya la capturan
+    pass
+
+
+def content_type(headers):
+    value = headers.get("Content-Type", "")
+    mime = value.split(";")[0].strip().lower()
+    charset = None
+    for param in value.split(";")[1:]:
+        key, _, val = param.partition("=")
+        if key.strip().lower() == "charset":
+            charset = val.strip().strip('"') or None
+    if charset:
+        try:
+            codecs.lookup(charset)
+        except LookupError:
+            charset = None
+    return mime, charset
+
+
+def check_content_type(headers, allowed_types=ALLOWED_TYPES):
+    # Sin Content-Type se deja pasar: muchos servidores de phishing no lo envían
+    mime, charset = content_type(headers)
+    if mime and allowed_types is not None and mime not in allowed_types:
+        inst.incr("fetch.rejected")
+        raise ContentRejected(f"Content-Type not allowed: {mime}")
+    return charset
+
+
+def iter_bounded(chunks, max_bytes, state):
+    # Deja pasar como mucho max_bytes; state["truncated"] indica si se cortó
+    received = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if received + len(chunk) > max_bytes:
+            rest = max_bytes - received
+            if rest:
+                yield chunk[:rest]
+            state["truncated"] = True
+            inst.incr("fetch.truncated")
+            inst.incr("fetch.bytes", max_bytes)
+            return
+        received += len(chunk)
+        yield chunk
+    inst.incr("fetch.bytes", received)
+
+
+def iter_kept(chunks, kept):
+    for chunk in chunks:
+        kept.append(chunk)
+        yield chunk
+
+
+def fetch_page(url, session=requests, backend=fe.DEFAULT_BACKEND, features=None,
+               max_bytes=MAX_BYTES, allowed_types=ALLOWED_TYPES, timeout=TIMEOUT,
+               keep_body=False):
+    with inst.timer("fetch.request"):
+        response = session.get(url, verify=False, timeout=timeout, stream=True)
+    inst.incr(f"fetch.status.{response.status_code}")
+    with response:
+        headers = dict(response.headers)
+        if response.status_code != 200:
+            return Page(url, response.status_code, headers, None, None, False)
+
+        charset = check_content_type(response.headers, allowed_types)
+        state = {"truncated": False}
+        chunks = iter_bounded(response.iter_content(CHUNK_SIZE), max_bytes, state)
+        kept = []
+        if keep_body:
+            chunks = iter_kept(chunks, kept)
+        vector = fe.create_vector(chunks, backend=backend, features=features, encoding=charset)
+        # Al salir del `with` se cierra la conexión: lo que quede sin leer se descarta
+
+    body = b"".join(kept) if keep_body else None
+    return Page(url, response.status_code, headers, vector, body, state["truncated"], charset)
+
+
+def fetch_body(url, session=requests, max_bytes=MAX_BYTES, allowed_types=ALLOWED_TYPES,
+               timeout=TIMEOUT):
+    # Igual que fetch_page pero sin extraer: devuelve el cuerpo (acotado) para
+    # quien quiere decidir antes si hace falta puntuarlo (p.ej. verdict_cache.py)
+    with inst.timer("fetch.request"):
+        response = session.get(url, verify=False, timeout=timeout, stream=True)
+    inst.incr(f"fetch.status.{response.status_code}")
+    with response:
+        headers = dict(response.headers)
+        if response.status_code != 200:
+            return Page(url, response.status_code, headers, None, None, False)
+
+        charset = check_content_type(response.headers, allowed_types)
+        state = {"truncated": False}
+        with inst.timer("fetch.body"):
+            body = b"".join(iter_bounded(response.iter_content(CHUNK_SIZE), max_bytes, state))
+
+    return Page(url, response.status_code, headers, None, body, state["truncated"], charset)
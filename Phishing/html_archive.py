@@ -0,0 +1,259 @@
+# -----------------------------
+# Archivo de HTML direccionado por contenido
+# -----------------------------
+# Guarda cada respuesta descargada para poder recalcular las
+# características sin volver a descargar nada.
+#
+#   <archivo>/segments/seg-00000.bin   cuerpos comprimidos (zlib), sólo se añade
+#   <archivo>/index.sqlite             índice: blobs (sha256 -> segmento, offset)
+#                                      y fetches (URL, estado, cabeceras, fecha)
+#
+# El cuerpo se identifica por su sha256: dos URLs con la misma página
+# comparten un único blob. La lectura usa mmap sobre los segmentos.
+
+import os
+import csv
+import json
+import mmap
+import time
+import zlib
+import struct
+import sqlite3
+import feature_extraction as fe
+import feature_registry as fr
+import fetcher
+import feature_cache
+import verdict_cache as vc
+import sparse_features
+
+
+SEGMENT_SIZE = 256 * 1024 * 1024
+COMMIT_EVERY = 100
+
+# Cabecera de cada registro: sha256 (32 bytes) + longitud comprimida
+RECORD_HEADER = struct.Struct("<32sI")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fetches (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    sha TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fetches_url ON fetches (url);
+"""
+
+
+def segment_path(root, segment):
+    return os.path.join(root, "segments", f"seg-{segment:05d}.bin")
+
+
+def open_index(root):
+    os.makedirs(os.path.join(root, "segments"), exist_ok=True)
+    db = sqlite3.connect(os.path.join(root, "index.sqlite"))
+    db.executescript(SCHEMA)
+    return db
+
+
+class ArchiveWriter:
+
+    def __init__(self, root, segment_size=SEGMENT_SIZE):
+        self.root = root
+        self.segment_size = segment_size
+        self.db = open_index(root)
+        last = self.db.execute("SELECT MAX(segment) FROM blobs").fetchone()[0]
+        self.segment = last or 0
+        self.file = open(segment_path(root, self.segment), "ab")
+        self.pending = 0
+
+    def add(self, url, status, headers, body, fetched_at=None):
+        sha = vc.content_hash(body)
+        known = self.db.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,)).fetchone()
+        if not known:
+            self._write_blob(sha, body)
+        self.db.execute(
+            "INSERT INTO fetches (url, status, headers, fetched_at, sha) VALUES (?, ?, ?, ?, ?)",
+            (url, status, json.dumps(dict(headers)), fetched_at or time.time(), sha),
+        )
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+        return sha
+
+    def _write_blob(self, sha, body):
+        compressed = zlib.compress(body, 6)
+        if self.file.tell() > 0 and self.file.tell() + len(compressed) > self.segment_size:
+            self.file.close()
+            self.segment += 1
+            self.file = open(segment_path(self.root, self.segment), "ab")
+        self.file.write(RECORD_HEADER.pack(bytes.fromhex(sha), len(compressed)))
+        offset = self.file.tell()
+        self.file.write(compressed)
+        self.db.execute(
+            "INSERT INTO blobs (sha, segment, offset, length, size) VALUES (?, ?, ?, ?, ?)",
+            (sha, self.segment, offset, len(compressed), len(body)),
+        )
+
+    def commit(self):
+        # Primero los datos, luego el índice que apunta a ellos
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.file.close()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+
+    def __init__(self, root):
+        self.root = root
+        self.db = open_index(root)
+        self.maps = {}
+
+    def _map(self, segment):
+        if segment not in self.maps:
+            with open(segment_path(self.root, segment), "rb") as f:
+                self.maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.maps[segment]
+
+    def _read(self, segment, offset, length):
+        return zlib.decompress(self._map(segment)[offset:offset + length])
+
+    def get_body(self, sha):
+        row = self.db.execute(
+            "SELECT segment, offset, length FROM blobs WHERE sha = ?", (sha,)
+        ).fetchone()
+        return self._read(*row) if row else None
+
+    def latest(self, url):
+        row = self.db.execute(
+            "SELECT status, headers, fetched_at, sha FROM fetches WHERE url = ? "
+            "ORDER BY fetched_at DESC LIMIT 1", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, fetched_at, sha = row
+        return {"url": url, "status": status, "headers": json.loads(headers),
+                "fetched_at": fetched_at, "sha": sha, "body": self.get_body(sha)}
+
+    def iter_records(self, status=200):
+        # Recorre el archivo en orden de segmento/offset: lectura secuencial
+        query = (
+            "SELECT f.url, f.status, f.headers, f.fetched_at, f.sha, b.segment, b.offset, b.length "
+            "FROM fetches f JOIN blobs b ON b.sha = f.sha "
+            + ("WHERE f.status = ? " if status is not None else "")
+            + "ORDER BY b.segment, b.offset, f.id"
+        )
+        params = (status,) if status is not None else ()
+        last_sha, body = None, None
+        for url, code, headers, fetched_at, sha, segment, offset, length in self.db.execute(query, params):
+            if sha != last_sha:
+                body = self._read(segment, offset, length)
+                last_sha = sha
+            yield {"url": url, "status": code, "headers": json.loads(headers),
+                   "fetched_at": fetched_at, "sha": sha, "body": body}
+
+    def close(self):
+        for m in self.maps.values():
+            m.close()
+        self.maps = {}
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------
+# Re-extracción offline
+# -----------------------------
+
+REBUILD_BATCH = 256   # registros por consulta a la caché de características
+
+
+def record_charset(record):
+    # charset del Content-Type archivado (las cabeceras se guardan tal cual llegaron)
+    headers = {key.lower(): value for key, value in record["headers"].items()}
+    return fetcher.content_type({"Content-Type": headers.get("content-type", "")})[1]
+
+
+def write_rows(writer, records, label, backend, cache, hashed=None):
+    # hashed: lista a la que se añaden (URL, fila) del bloque de
+    # sparse_features.py; cada página se parsea igualmente una sola vez
+    encodings = [record_charset(record) for record in records]
+    if hashed is not None:
+        vectors = []
+        for record, encoding in zip(records, encodings):
+            tokens = sparse_features.HashedTokens()
+            vectors.append(fe.create_vector(record["body"], backend=backend, encoding=encoding, tokens=tokens))
+            hashed.append((record["url"], tokens.row()))
+        if cache is not None:
+            cache.store_many([(record["sha"], dict(zip(fr.FEATURE_NAMES, vector)))
+                              for record, vector in zip(records, vectors)])
+    elif cache is None:
+        vectors = [fe.create_vector(record["body"], backend=backend, encoding=encoding)
+                   for record, encoding in zip(records, encodings)]
+    else:
+        # El sha del archivo es el mismo hash de contenido que usa la caché
+        vectors = feature_cache.cached_vectors(cache, [record["body"] for record in records], backend,
+                                               encodings=encodings, shas=[record["sha"] for record in records])
+    for record, vector in zip(records, vectors):
+        writer.writerow(vector + [record["url"], label])
+    return len(records)
+
+
+def rebuild_structured_data(root, output_csv, label, backend=fe.DEFAULT_BACKEND, cache_path=None,
+                            hashed=False):
+    # cache_path: caché de feature_cache.py; sólo se extraen las páginas (o
+    # las características) que no estén ya en ella
+    # hashed: guarda también el bloque disperso en sparse_features.block_path(output_csv)
+    rows = 0
+    cache = feature_cache.FeatureCache(cache_path) if cache_path else None
+    block = [] if hashed else None
+    try:
+        with ArchiveReader(root) as archive, open(output_csv, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out)
+            writer.writerow(fr.FEATURE_NAMES + ["URL", "label"])
+            records = []
+            for record in archive.iter_records():
+                records.append(record)
+                if len(records) >= REBUILD_BATCH:
+                    rows += write_rows(writer, records, label, backend, cache, block)
+                    records = []
+            rows += write_rows(writer, records, label, backend, cache, block)
+    finally:
+        if cache is not None:
+            cache.close()
+    if block is not None:
+        sparse_features.save_block(sparse_features.block_path(output_csv),
+                                   [url for url, _ in block], [row for _, row in block])
+    return rows
+
+
+if __name__ == "__main__":
+    ARCHIVE_DIR = "html_archive"
+
+    rows = rebuild_structured_data(ARCHIVE_DIR, "structured_data_phishing.csv", label=1,
+                                   cache_path=feature_cache.CACHE_PATH, hashed=True)
+    print(f"✅ {rows} rows rebuilt from {ARCHIVE_DIR}")
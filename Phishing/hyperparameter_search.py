@@ -0,0 +1,200 @@
+# -----------------------------
+# Búsqueda de hiperparámetros (successive halving)
+# -----------------------------
+# machine_learning.py usa hiperparámetros fijados a mano. Aquí se prueban
+# las configuraciones de SEARCH_SPACE para los siete modelos:
+#
+# - por rondas: en la primera todas las candidatas se evalúan con K-fold
+#   sobre un subconjunto pequeño de los datos; en cada ronda siguiente sólo
+#   sigue la mejor 1/ETA de cada modelo, con ETA veces más filas. La última
+#   ronda usa todos los datos.
+# - en paralelo: cada (modelo, candidata, fold) de una ronda es un trabajo
+#   del pool de procesos, como en machine_learning.cross_validate
+# - sin repetir trabajo: X/Y se convierten a numpy una vez y llegan a cada
+#   proceso una sola vez (initializer); los subconjuntos son prefijos de un
+#   mismo orden estratificado y los folds de cada ronda son índices que se
+#   calculan una vez y comparten todas las candidatas
+#
+# Las mejores configuraciones se guardan en models/TUNING/ (mismo formato de
+# versiones que model_store.py) y machine_learning.train_and_save las usa y
+# las apunta en los metadatos de cada modelo.
+#
+#   python hyperparameter_search.py [--models RF KN] [--no-train]
+
+import math
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid
+import model_store as ms
+import machine_learning as ml
+from datasets import load_datasets, prepare_data
+import warnings
+warnings.filterwarnings("ignore")
+
+
+ETA = 3
+MIN_ROWS = 20   # filas de la primera ronda como mínimo (K folds con ambas clases)
+
+# La primera combinación de cada rejilla es la de create_models(): en caso
+# de empate gana la configuración actual
+SEARCH_SPACE = {
+    "NB": {"var_smoothing": [1e-9, 1e-8, 1e-7, 1e-6, 1e-5]},
+    "SVM": {"C": [1.0, 0.01, 0.1, 10.0], "class_weight": [None, "balanced"]},
+    "DT": {"max_depth": [None, 4, 8, 16], "min_samples_leaf": [1, 2, 5],
+           "criterion": ["gini", "entropy"]},
+    "RF": {"n_estimators": [60, 30, 120], "max_depth": [None, 8, 16],
+           "max_features": ["sqrt", 0.5]},
+    "AB": {"n_estimators": [50, 25, 100], "learning_rate": [1.0, 0.5]},
+    "NN": {"alpha": [1, 0.1, 10], "hidden_layer_sizes": [(100,), (50,), (100, 50)]},
+    "KN": {"n_neighbors": [5, 3, 9, 15], "weights": ["uniform", "distance"]},
+}
+
+
+def candidates(key):
+    return list(ParameterGrid(SEARCH_SPACE[key])) if key in SEARCH_SPACE else [{}]
+
+
+def stratified_order(Y, seed=0):
+    # Permutación en la que cualquier prefijo mantiene la proporción de clases
+    rng = np.random.default_rng(seed)
+    groups = [rng.permutation(np.flatnonzero(Y == label)) for label in np.unique(Y)]
+    rank = np.concatenate([(np.arange(len(g)) + rng.random()) / len(g) for g in groups])
+    return np.concatenate(groups)[np.argsort(rank, kind="stable")]
+
+
+def rung_sizes(total, n_rounds, eta=ETA, min_rows=MIN_ROWS):
+    sizes = [max(min(min_rows, total), total // eta ** (n_rounds - 1 - i)) for i in range(n_rounds)]
+    return sorted(set(sizes))
+
+
+def subset_folds(order, rows, K):
+    # Folds de kfold_indices sobre el prefijo order[:rows], en índices de X
+    subset = order[:rows]
+    return [(subset[train], subset[test]) for train, test in ml.kfold_indices(rows, K)]
+
+
+def run_candidate(model, train_idx, test_idx):
+    # Se ejecuta en el pool: X/Y vienen de ml.init_worker
+    start = time.perf_counter()
+    measures, _, _ = ml.run_fold(model, train_idx, test_idx)
+    return measures, time.perf_counter() - start
+
+
+def n_rounds(n_candidates, eta=ETA):
+    # Rondas hasta que sólo queda una candidata
+    rounds = 1
+    while n_candidates > eta:
+        n_candidates = math.ceil(n_candidates / eta)
+        rounds += 1
+    return rounds
+
+
+def halve(scores, eta=ETA):
+    # Índices de la mejor 1/eta (al menos una), de mejor a peor; ante un
+    # empate se queda la que va antes en la rejilla
+    keep = max(1, math.ceil(len(scores) / eta))
+    return sorted(range(len(scores)), key=lambda i: -scores[i]["accuracy"])[:keep]
+
+
+def search(X, Y, keys=None, K=5, eta=ETA, workers=None, seed=0):
+    X = np.ascontiguousarray(X.to_numpy() if hasattr(X, "to_numpy") else X)
+    Y = np.ascontiguousarray(Y.to_numpy() if hasattr(Y, "to_numpy") else Y)
+    base = ml.create_models()
+    keys = list(keys or base)
+    alive = {key: candidates(key) for key in keys}
+    rounds = max(n_rounds(len(configs), eta) for configs in alive.values())
+    order = stratified_order(Y, seed)
+    history = []
+
+    with ProcessPoolExecutor(workers, initializer=ml.init_worker, initargs=(X, Y)) as pool:
+        for round_, rows in enumerate(rung_sizes(len(Y), rounds, eta)):
+            folds = subset_folds(order, rows, K)
+            jobs = {
+                (key, c, i): pool.submit(run_candidate, clone(base[key]).set_params(**params), train, test)
+                for key, configs in alive.items()
+                for c, params in enumerate(configs)
+                for i, (train, test) in enumerate(folds)
+            }
+            results = {job_key: job.result() for job_key, job in jobs.items()}
+
+            for key, configs in alive.items():
+                scores = []
+                for c, params in enumerate(configs):
+                    fold_results = [results[key, c, i] for i in range(len(folds))]
+                    score = {
+                        "accuracy": float(np.mean([m[0] for m, _ in fold_results])),
+                        "precision": float(np.mean([m[1] for m, _ in fold_results])),
+                        "recall": float(np.mean([m[2] for m, _ in fold_results])),
+                        "fit_seconds": float(np.mean([s for _, s in fold_results])),
+                    }
+                    scores.append(score)
+                    history.append({"model": key, "round": round_, "rows": rows,
+                                    "params": params, **score})
+                # Tras la última ronda la primera que queda es la ganadora
+                alive[key] = [configs[i] for i in halve(scores, eta)]
+
+    best = {key: configs[0] for key, configs in alive.items()}
+    final = {}
+    for row in history:
+        if row["params"] == best[row["model"]]:
+            final[row["model"]] = row   # la última ronda en la que se evaluó
+    return best, final, history
+
+
+def to_json(params):
+    # Las tuplas (hidden_layer_sizes) se guardan como listas
+    return {key: list(value) if isinstance(value, tuple) else value for key, value in params.items()}
+
+
+def save_tuning(best, final, history, train_hash, K, eta, models_dir=ms.MODELS_DIR):
+    metadata = {
+        "name": "Hyperparameter search (successive halving)",
+        "train_data_hash": train_hash,
+        "cv_folds": K,
+        "eta": eta,
+        "best_params": {model: to_json(params) for model, params in best.items()},
+        "best_metrics": {model: {m: row[m] for m in ("rows", "accuracy", "precision", "recall")}
+                         for model, row in final.items()},
+        "history": [{**row, "params": to_json(row["params"])} for row in history],
+    }
+    return ms.save_metadata(ml.TUNING_KEY, metadata, models_dir)
+
+
+def tune(keys=None, K=5, eta=ETA, workers=None, models_dir=ms.MODELS_DIR, seed=0):
+    legitimate_df, phishing_df = load_datasets(urls=False)
+    df, X, Y = prepare_data(legitimate_df, phishing_df)
+    best, final, history = search(X, Y, keys, K, eta, workers, seed)
+    # Al buscar sólo algunos modelos se conservan los demás de la búsqueda anterior
+    previous, _ = ml.tuned_params(models_dir)
+    best = {**previous, **{key: to_json(params) for key, params in best.items()}}
+    return save_tuning(best, final, history, ms.data_hash(df), K, eta, models_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search")
+    parser.add_argument("--models", nargs="+", choices=list(SEARCH_SPACE), help="models to tune (default: all)")
+    parser.add_argument("--eta", type=int, default=ETA, help="keep 1/eta of the candidates each round")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-train", action="store_true", help="only save the search, do not retrain")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tuning = tune(args.models, eta=args.eta, workers=args.workers)
+    rounds = pd.DataFrame(tuning["history"]).groupby(["model", "round"]).agg(
+        rows=("rows", "first"), candidates=("params", "size"), best_accuracy=("accuracy", "max"))
+    print(rounds.unstack("round").fillna("").to_string())
+    for key, params in tuning["best_params"].items():
+        metrics = tuning["best_metrics"].get(key)
+        score = f" (accuracy {metrics['accuracy']:.3f} on {metrics['rows']} rows)" if metrics else ""
+        print(f"{key}: {params}{score}")
+    print(f"Search v{tuning['version']} saved in {ms.model_dir(ml.TUNING_KEY)}/ "
+          f"({len(tuning['history'])} evaluations, {time.perf_counter() - start:.1f}s)")
+
+    if not args.no_train:
+        df_results = ml.train_and_save()
+        print("Retrained with the best configurations:")
+        print(df_results.round(3).to_string())
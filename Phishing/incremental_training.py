@@ -0,0 +1,221 @@
+# -----------------------------
+# Entrenamiento incremental con lotes nuevos
+# -----------------------------
+# machine_learning.py reentrena los siete modelos desde cero con todos los
+# CSV. Con un lote nuevo (p.ej. la salida de data_collector.py):
+#
+# - NB y NN (PARTIAL_FIT) se actualizan con partial_fit sólo con las filas
+#   nuevas, partiendo de su última versión
+# - el resto (árboles, SVM, KNN) se reconstruye con todos los datos sólo si
+#   toca: los datos han crecido más de REBUILD_GROWTH desde la última
+#   reconstrucción o ésta tiene más de REBUILD_DAYS días
+#
+# Cada modelo actualizado es una versión nueva en model_store.py. Una parte
+# del lote (HOLDOUT) no se usa para entrenar: con ella se compara cada
+# modelo con un reentrenamiento completo. Si cambia algún modelo de la
+# cascada, sus umbrales se recalibran también con el holdout. Al final el
+# lote se añade a los CSV para que lo usen las próximas reconstrucciones.
+#
+#   python incremental_training.py nuevo_lote.csv [--no-compare] [--rebuild]
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import confusion_matrix
+import feature_registry as fr
+import model_store as ms
+import datasets
+import cascade
+import machine_learning as ml
+import warnings
+warnings.filterwarnings("ignore")
+
+
+PARTIAL_FIT = ("NB", "NN")
+REBUILD_GROWTH = 0.2
+REBUILD_DAYS = 7
+PARTIAL_EPOCHS = {"NB": 1, "NN": 5}   # pasadas de partial_fit sobre el lote
+HOLDOUT = 0.2
+CALIBRATION_ROWS = 20   # holdout mínimo para recalibrar la cascada
+CLASSES = np.array([0, 1])
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def read_batch(paths):
+    batch = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    fr.check_columns(batch.columns)
+    if "label" not in batch.columns:
+        raise ValueError("The batch needs a 'label' column (1 = phishing, 0 = legitimate)")
+    return batch.drop_duplicates(subset=fr.FEATURE_NAMES + ["label"]).reset_index(drop=True)
+
+
+def split_holdout(batch, fraction=HOLDOUT, seed=0):
+    order = np.random.default_rng(seed).permutation(len(batch))
+    n_test = int(round(len(batch) * fraction))
+    return batch.iloc[order[n_test:]], batch.iloc[order[:n_test]]
+
+
+def evaluate(model, X, Y):
+    if len(X) == 0:
+        return {}
+    tn, fp, fn, tp = confusion_matrix(Y, model.predict(X), labels=[0, 1]).ravel()
+    accuracy, precision, recall = ml.calculate_measures(tn, tp, fn, fp)
+    return {"accuracy": float(accuracy), "precision": float(precision), "recall": float(recall)}
+
+
+def rebuild_due(metadata, total_rows, now):
+    if metadata is None:
+        return True, "no saved version"
+    rows = metadata.get("rows_at_rebuild", metadata.get("train_rows"))
+    if rows is None or total_rows >= rows * (1 + REBUILD_GROWTH):
+        return True, f"data grew from {rows} to {total_rows} rows"
+    rebuilt_at = time.mktime(time.strptime(metadata.get("rebuilt_at", metadata["created_at"]), TIME_FORMAT))
+    if now - rebuilt_at >= REBUILD_DAYS * 86400:
+        return True, f"last rebuild older than {REBUILD_DAYS} days"
+    return False, f"{total_rows}/{rows} rows, rebuilt {metadata.get('rebuilt_at', metadata['created_at'])}"
+
+
+def partial_update(key, model, X, Y):
+    for _ in range(PARTIAL_EPOCHS.get(key, 1)):
+        model.partial_fit(X, Y, classes=CLASSES)
+    return model
+
+
+def recalibrate_cascade(config, models, X_test, Y_test, models_dir=ms.MODELS_DIR):
+    # Ningún modelo (actualizado o conservado) ha visto el holdout al
+    # entrenar: sus predicciones hacen el papel de las de fuera de fold
+    oof = {}
+    for key in config["stages"] + config["ensemble"]:
+        model = models[key]
+        pred = np.asarray(model.predict(X_test))
+        proba = model.predict_proba(X_test)[:, 1] if hasattr(model, "predict_proba") else pred
+        oof[key] = {"pred": pred, "proba": np.asarray(proba)}
+    new_config = cascade.calibrate(oof, Y_test.to_numpy(), config["stages"], config["ensemble"])
+    return cascade.save_cascade(new_config, models_dir)
+
+
+def update(batch_paths, compare=True, rebuild=False, append=True, models_dir=ms.MODELS_DIR, seed=0):
+    legitimate_df, phishing_df = datasets.load_datasets(urls=False)
+    old_df, X_old, Y_old = datasets.prepare_data(legitimate_df, phishing_df)
+    batch = read_batch(batch_paths)
+    new_train, holdout = split_holdout(batch, HOLDOUT, seed)
+
+    X_new, Y_new = new_train[fr.FEATURE_NAMES], new_train["label"]
+    X_test, Y_test = holdout[fr.FEATURE_NAMES], holdout["label"]
+    X_all = pd.concat([X_old, X_new], ignore_index=True)
+    Y_all = pd.concat([Y_old, Y_new], ignore_index=True)
+    train_hash = ms.data_hash(pd.concat([old_df, new_train[old_df.columns]], ignore_index=True))
+    now = time.time()
+    now_str = time.strftime(TIME_FORMAT, time.localtime(now))
+
+    # Los modelos reconstruidos usan los hiperparámetros de la última búsqueda
+    params, tuning_version = ml.tuned_params(models_dir)
+    report = {}
+    models = {}   # modelo vigente de cada clave tras la actualización
+    for key, fresh in ml.create_models(params).items():
+        metadata = ms.load_metadata(key, models_dir=models_dir)
+        start = time.perf_counter()
+
+        if key in PARTIAL_FIT and metadata is not None and not rebuild:
+            model, _ = ms.load_model(key, models_dir=models_dir)
+            partial_update(key, model, X_new, Y_new)
+            mode, reason = "partial_fit", f"{len(X_new)} new rows"
+            extra = {
+                "update": mode,
+                "base_version": metadata["version"],
+                "train_rows": metadata.get("train_rows", 0) + len(X_new),
+                "rows_at_rebuild": metadata.get("rows_at_rebuild", metadata.get("train_rows")),
+                "rebuilt_at": metadata.get("rebuilt_at", metadata["created_at"]),
+                "partial_updates": metadata.get("partial_updates", 0) + 1,
+                "tuned_params": metadata.get("tuned_params", {}),
+                "tuning_version": metadata.get("tuning_version"),
+            }
+        else:
+            due, reason = (True, "forced") if rebuild else rebuild_due(metadata, len(X_all), now)
+            if not due:
+                model, _ = ms.load_model(key, models_dir=models_dir)
+                models[key] = model
+                report[key] = {"mode": "kept", "version": metadata["version"], "reason": reason,
+                               "holdout": evaluate(model, X_test, Y_test)}
+                continue
+            model = clone(fresh).fit(X_all, Y_all)
+            mode = "rebuild"
+            extra = {
+                "update": mode,
+                "train_rows": len(X_all),
+                "rows_at_rebuild": len(X_all),
+                "rebuilt_at": now_str,
+                "partial_updates": 0,
+                "tuned_params": params.get(key, {}),
+                "tuning_version": tuning_version,
+            }
+        seconds = time.perf_counter() - start
+        models[key] = model
+
+        row = {"mode": mode, "reason": reason, "seconds": round(seconds, 3),
+               "holdout": evaluate(model, X_test, Y_test)}
+        if compare and mode == "partial_fit":
+            # Referencia: el mismo modelo reentrenado desde cero con todo
+            start = time.perf_counter()
+            full = clone(fresh).fit(X_all, Y_all)
+            row["full_retrain"] = evaluate(full, X_test, Y_test)
+            row["full_retrain_seconds"] = round(time.perf_counter() - start, 3)
+
+        # Las métricas CV sólo existen tras machine_learning.py: se arrastran
+        cv_metrics = metadata.get("cv_metrics", {}) if metadata and mode == "partial_fit" else {}
+        extra.update({"holdout_metrics": row["holdout"], "holdout_rows": len(holdout),
+                      "full_retrain_metrics": row.get("full_retrain")})
+        saved = ms.save_model(key, model, fr.FEATURE_NAMES, train_hash, cv_metrics=cv_metrics,
+                              extra=extra, models_dir=models_dir)
+        row["version"] = saved["version"]
+        report[key] = row
+
+    if append:
+        datasets.append_batch(batch)
+
+    updated = {key for key, row in report.items() if row["mode"] != "kept"}
+    config = ms.load_metadata(cascade.CASCADE_KEY, models_dir=models_dir)
+    if config and updated & set(config["stages"] + config["ensemble"]):
+        if len(holdout) >= CALIBRATION_ROWS:
+            saved = recalibrate_cascade(config, models, X_test, Y_test, models_dir)
+            print(f"Cascade recalibrated on {len(holdout)} holdout rows: v{saved['version']}, "
+                  f"accuracy {saved['cv_metrics']['accuracy']:.3f}, "
+                  f"{saved['cv_metrics']['early_exit']:.0%} decided by the first stage")
+        else:
+            # Los que cargan modelos (app.py, batch_scoring.py, scoring_service.py)
+            # dejan de ofrecerla hasta que se recalibre
+            print(f"⚠️ Only {len(holdout)} holdout rows: the cascade was not recalibrated, "
+                  "run machine_learning.py to recalibrate it")
+    return report
+
+
+def report_table(report):
+    rows = {}
+    for key, row in report.items():
+        holdout, full = row["holdout"], row.get("full_retrain", {})
+        rows[key] = {
+            "mode": row["mode"],
+            "version": row["version"],
+            "seconds": row.get("seconds"),
+            "accuracy": holdout.get("accuracy"),
+            "full_retrain_accuracy": full.get("accuracy"),
+            "full_retrain_seconds": row.get("full_retrain_seconds"),
+            "accuracy_delta": holdout["accuracy"] - full["accuracy"] if full and holdout else None,
+            "reason": row["reason"],
+        }
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the saved models with a new batch")
+    parser.add_argument("batch", nargs="+", help="structured CSV(s) with a label column")
+    parser.add_argument("--no-compare", action="store_true", help="skip the full retrain used as reference")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild every model from scratch")
+    parser.add_argument("--no-append", action="store_true", help="do not add the batch to the dataset CSVs")
+    args = parser.parse_args()
+
+    report = update(args.batch, compare=not args.no_compare, rebuild=args.rebuild, append=not args.no_append)
+    with pd.option_context("display.width", 200, "display.max_colwidth", 60):
+        print(report_table(report))
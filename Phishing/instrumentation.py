@@ -0,0 +1,292 @@
+# -----------------------------
+# Instrumentación: tiempos por etapa, métricas y perfilador
+# -----------------------------
+# Para saber a dónde va el tiempo de fetch -> parse -> extract -> predict:
+#
+# - timer("etapa") mide un bloque y lo añade a un histograma de latencias.
+#   Desactivado (lo normal) devuelve un contexto vacío compartido: el coste
+#   es una llamada a función.
+# - incr("contador") cuenta eventos (páginas, errores, bytes...).
+# - trace() recoge además los tiempos de un bloque concreto (p.ej. un Check!
+#   de app.py) en una lista.
+# - snapshot()/merge() permiten juntar métricas de varios procesos;
+#   export() las escribe en JSON o en formato de texto de Prometheus.
+# - SamplingProfiler muestrea la pila de un hilo cada pocos ms y la guarda
+#   en formato "collapsed" (flamegraph.pl, speedscope).
+#
+# Se activa con PHISHING_METRICS=1 o con enable().
+
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from contextlib import nullcontext, contextmanager
+from collections import Counter
+
+
+DEFAULT_ENABLED = os.environ.get("PHISHING_METRICS", "") not in ("", "0")
+ENABLED = DEFAULT_ENABLED
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+PROFILE_INTERVAL = 0.005   # segundos entre muestras
+
+_NULL = nullcontext()
+_local = threading.local()
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # el último es +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Límite superior del bucket donde cae el cuantil q
+        if not self.count:
+            return None
+        target, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum, "buckets": list(self.counts)}
+
+    def merge(self, snapshot):
+        self.count += snapshot["count"]
+        self.sum += snapshot["sum"]
+        self.counts = [a + b for a, b in zip(self.counts, snapshot["buckets"])]
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.histograms = {}
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def observe(self, name, ms):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+    def merge(self, snapshot):
+        with self.lock:
+            self.counters.update(snapshot["counters"])
+            for name, data in snapshot["histograms"].items():
+                self.histograms.setdefault(name, Histogram()).merge(data)
+
+    def drain(self):
+        # Snapshot y vaciado: para mandar las métricas de un worker al padre
+        with self.lock:
+            snapshot = {
+                "counters": dict(self.counters),
+                "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+            self.counters.clear()
+            self.histograms.clear()
+        return snapshot
+
+    def summary(self):
+        # Tabla legible: por histograma n, total, media, p50 y p99 (por bucket)
+        with self.lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "total_ms": round(h.sum, 3),
+                    "mean_ms": round(h.sum / h.count, 3) if h.count else None,
+                    "p50_ms": h.quantile(0.5),
+                    "p99_ms": h.quantile(0.99),
+                }
+                for name, h in sorted(self.histograms.items())
+            }
+
+    def to_prometheus(self, prefix="phishing"):
+        lines = []
+        snapshot = self.snapshot()
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{prefix}_{sanitize(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, data in sorted(snapshot["histograms"].items()):
+            metric = f"{prefix}_{sanitize(name)}_ms"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(list(BUCKETS_MS) + ["+Inf"], data["buckets"]):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{metric}_sum {data['sum']}", f"{metric}_count {data['count']}"]
+        return "\n".join(lines) + "\n"
+
+
+def sanitize(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+REGISTRY = Registry()
+
+
+# ----- API de módulo ----- #
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self.start) * 1000
+        REGISTRY.observe(self.name, ms)
+        spans = getattr(_local, "spans", None)
+        if spans is not None:
+            spans.append((self.name, ms))
+        return False
+
+
+def timer(name):
+    return _Timer(name) if ENABLED else _NULL
+
+
+def incr(name, n=1):
+    if ENABLED:
+        REGISTRY.incr(name, n)
+
+
+def observe(name, ms):
+    if ENABLED:
+        REGISTRY.observe(name, ms)
+
+
+@contextmanager
+def trace():
+    # Lista de (etapa, ms) de lo medido dentro del bloque, en este hilo
+    previous = getattr(_local, "spans", None)
+    _local.spans = spans = []
+    try:
+        yield spans
+    finally:
+        _local.spans = previous
+
+
+def snapshot():
+    return REGISTRY.snapshot()
+
+
+def merge(snapshot):
+    REGISTRY.merge(snapshot)
+
+
+def export(path):
+    # .prom -> texto de Prometheus, cualquier otra extensión -> JSON
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".prom"):
+            f.write(REGISTRY.to_prometheus())
+        else:
+            json.dump({"snapshot": REGISTRY.snapshot(), "summary": REGISTRY.summary()}, f, indent=2)
+    return path
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["snapshot"]
+
+
+# -----------------------------
+# Perfilador por muestreo
+# -----------------------------
+
+class SamplingProfiler:
+    # Hilo que cada `interval` segundos apunta la pila del hilo observado
+
+    def __init__(self, interval=PROFILE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                with self.lock:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def drain(self):
+        with self.lock:
+            samples, self.samples = dict(self.samples), Counter()
+        return samples
+
+    def merge(self, samples):
+        with self.lock:
+            self.samples.update(samples)
+
+    def top(self, n=15):
+        # Funciones con más muestras propias (en lo alto de la pila)
+        total = sum(self.samples.values())
+        own = Counter()
+        for stack, count in self.samples.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        return [(name, count, count / total) for name, count in own.most_common(n)]
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
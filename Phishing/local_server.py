@@ -0,0 +1,96 @@
+# -----------------------------
+# Servidor HTTP local de pruebas
+# -----------------------------
+# Sirve las páginas de mini_dataset para probar los recolectores sin salir
+# a Internet. Retardo y tasa de fallos configurables, globalmente o por
+# petición con parámetros en la URL:
+#   /page/<n>?delay=2&status=404&type=application/pdf&repeat=10
+# <n> recorre en bucle los ficheros de mini_dataset; repeat multiplica el
+# tamaño de la página y type cambia el Content-Type.
+
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+DATASET_DIR = "mini_dataset"
+
+
+def load_pages(dataset_dir=DATASET_DIR):
+    pages = []
+    for filename in sorted(os.listdir(dataset_dir)):
+        if filename.endswith(".html"):
+            with open(os.path.join(dataset_dir, filename), "rb") as f:
+                pages.append(f.read())
+    return pages
+
+
+def make_handler(pages, delay, failure_rate, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class PageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive: permite reutilizar conexiones
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+            parts = parsed.path.strip("/").split("/")
+
+            wait = float(query.get("delay", [delay])[0])
+            if wait:
+                time.sleep(wait)
+
+            with lock:
+                failed = rng.random() < failure_rate
+            status = int(query.get("status", [500 if failed else 200])[0])
+
+            if len(parts) != 2 or parts[0] != "page" or not parts[1].isdigit():
+                status = 404
+            body = pages[int(parts[1]) % len(pages)] if status == 200 else b"error"
+            body *= int(query.get("repeat", [1])[0])
+
+            self.send_response(status)
+            self.send_header("Content-Type", query.get("type", ["text/html; charset=utf-8"])[0])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PageHandler
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Los clientes cierran conexiones keep-alive a su antojo
+        pass
+
+
+def start_server(dataset_dir=DATASET_DIR, delay=0.0, failure_rate=0.0, seed=0,
+                 host="127.0.0.1", port=0):
+    # port=0 elige un puerto libre; devuelve (servidor, URL base)
+    handler = make_handler(load_pages(dataset_dir), delay, failure_rate, seed)
+    server = QuietServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def page_urls(base_url, n):
+    return [f"{base_url}/page/{i}" for i in range(n)]
+
+
+if __name__ == "__main__":
+    server, base_url = start_server(port=8000, delay=0.2, failure_rate=0.1)
+    print("Serving mini_dataset at", base_url, "(Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
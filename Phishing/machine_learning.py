@@ -1,7 +1,10 @@
 # machine_learning.py
+import sys
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from scipy import sparse
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.base import clone
 from sklearn import svm
 from sklearn import tree
 from sklearn.naive_bayes import GaussianNB
@@ -9,57 +12,69 @@ from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
 from sklearn.neural_network import MLPClassifier
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.metrics import confusion_matrix
+import feature_registry as fr
+import model_store as ms
+import cascade
+import sparse_features as sf
+from datasets import load_datasets, prepare_data, prepare_hashed_data
 import warnings
 warnings.filterwarnings("ignore")
 
-# ----- Step 1: Cargar los datasets ----- #
-legitimate_df = pd.read_csv('structured_data_legitimate.csv')
-phishing_df = pd.read_csv('structured_data_phishing.csv')
+# Importar este módulo ya no entrena nada: el entrenamiento se lanza con
+# `python machine_learning.py`, que guarda los modelos en model_store.py.
+# app.py sólo carga los modelos guardados.
 
-# ----- Step 2: Combinar y limpiar datos ----- #
-df = pd.concat([legitimate_df, phishing_df], axis=0)
-df = df.sample(frac=1).reset_index(drop=True)
-df = df.drop('URL', axis=1)
-df = df.drop_duplicates()
 
-X = df.drop('label', axis=1)
-Y = df['label']
+# Mejores hiperparámetros de hyperparameter_search.py (models/TUNING/)
+TUNING_KEY = "TUNING"
+
+# Modelos que aceptan el bloque disperso de sparse_features.py; se guardan
+# como <clave>_HASHED. GaussianNB sólo admite matrices densas y la primera
+# capa del MLP es una matriz densa N_FEATURES x 100 (lenta de entrenar)
+SPARSE_MODELS = ("SVM", "DT", "RF", "AB", "KN")
+HASHED_SUFFIX = "_HASHED"
 
-# ----- Step 3: Train/Test split (solo para ejemplo rápido) ----- #
-x_train, x_test, y_train, y_test = train_test_split(X, Y, test_size=0.2, random_state=10)
 
 # ----- Step 4: Crear modelos ----- #
-svm_model = svm.LinearSVC()
-rf_model = RandomForestClassifier(n_estimators=60)
-dt_model = tree.DecisionTreeClassifier()
-ab_model = AdaBoostClassifier()
-nb_model = GaussianNB()
-nn_model = MLPClassifier(alpha=1, max_iter=500)
-kn_model = KNeighborsClassifier()
-
-# ----- Step 5: Entrenar todos los modelos con todo el dataset de ejemplo ----- #
-svm_model.fit(x_train, y_train)
-rf_model.fit(x_train, y_train)
-dt_model.fit(x_train, y_train)
-ab_model.fit(x_train, y_train)
-nb_model.fit(x_train, y_train)
-nn_model.fit(x_train, y_train)
-kn_model.fit(x_train, y_train)
+def create_models(params=None):
+    # params: {modelo: {parámetro: valor}} que sustituyen a los de aquí
+    models = {
+        'NB': GaussianNB(),
+        'SVM': svm.LinearSVC(),
+        'DT': tree.DecisionTreeClassifier(),
+        'RF': RandomForestClassifier(n_estimators=60),
+        'AB': AdaBoostClassifier(),
+        'NN': MLPClassifier(alpha=1, max_iter=500),
+        'KN': KNeighborsClassifier()
+    }
+    for name, overrides in (params or {}).items():
+        if name in models:
+            models[name].set_params(**overrides)
+    return models
+
+
+def tuned_params(models_dir=ms.MODELS_DIR):
+    # Última búsqueda guardada: ({modelo: parámetros}, versión) o ({}, None)
+    tuning = ms.load_metadata(TUNING_KEY, models_dir=models_dir)
+    if tuning is None:
+        return {}, None
+    return tuning["best_params"], tuning["version"]
 
-# ----- Step 6: K-Fold manual (K=5) ----- #
-K = 5
-total = X.shape[0]
-index = total // K
 
-X_train_list, X_test_list, Y_train_list, Y_test_list = [], [], [], []
+# ----- Step 6: K-Fold manual (K=5) ----- #
+# Cada fold es un par de arrays de índices sobre X/Y: no se copian los datos
+def kfold_indices(total, K=5):
+    index = total // K
+    positions = np.arange(total)
+    folds = []
+    for i in range(K):
+        start = i * index
+        end = (i + 1) * index if i < K - 1 else total
+        test_idx = positions[start:end]
+        train_idx = np.concatenate([positions[:start], positions[end:]])
+        folds.append((train_idx, test_idx))
+    return folds
 
-for i in range(K):
-    start = i * index
-    end = (i + 1) * index if i < K - 1 else total
-    X_test_list.append(X.iloc[start:end])
-    X_train_list.append(pd.concat([X.iloc[:start], X.iloc[end:]], axis=0))
-    Y_test_list.append(Y.iloc[start:end])
-    Y_train_list.append(pd.concat([Y.iloc[:start], Y.iloc[end:]], axis=0))
 
 # ----- Step 7: Función para calcular métricas ----- #
 def calculate_measures(TN, TP, FN, FP):
@@ -68,41 +83,142 @@ def calculate_measures(TN, TP, FN, FP):
     recall = TP / (TP + FN) if (TP + FN) != 0 else 0
     return accuracy, precision, recall
 
-# ----- Step 8: Inicializar listas de resultados ----- #
-models = {
-    'NB': nb_model,
-    'SVM': svm_model,
-    'DT': dt_model,
-    'RF': rf_model,
-    'AB': ab_model,
-    'NN': nn_model,
-    'KN': kn_model
-}
-
-results_acc = {name: [] for name in models}
-results_prec = {name: [] for name in models}
-results_rec = {name: [] for name in models}
-
-# ----- Step 9: K-Fold cross validation ----- #
-for i in range(K):
+
+# ----- Step 8-10: K-Fold cross validation en paralelo ----- #
+# Cada trabajo (fold, modelo) va a un proceso del pool. X e Y se pasan una
+# sola vez a cada proceso (initializer) y los folds son sólo índices.
+_shared = {}
+
+
+def init_worker(X, Y):
+    _shared["X"] = X
+    _shared["Y"] = Y
+
+
+def run_fold(model, train_idx, test_idx):
+    X, Y = _shared["X"], _shared["Y"]
+    model.fit(X[train_idx], Y[train_idx])
+    pred = model.predict(X[test_idx])
+    tn, fp, fn, tp = confusion_matrix(Y[test_idx], pred, labels=[0, 1]).ravel()
+    # Predicciones fuera de fold: cascade.py calibra sus umbrales con ellas
+    proba = model.predict_proba(X[test_idx])[:, 1] if hasattr(model, "predict_proba") else None
+    return calculate_measures(tn, tp, fn, fp), pred, proba
+
+
+def out_of_fold(results, folds, names, total):
+    oof = {}
+    for name in names:
+        pred = np.zeros(total, dtype=np.int64)
+        proba = np.zeros(total)
+        for i, (_, test_idx) in enumerate(folds):
+            _, fold_pred, fold_proba = results[name, i]
+            pred[test_idx] = fold_pred
+            proba[test_idx] = fold_proba if fold_proba is not None else fold_pred
+        oof[name] = {"pred": pred, "proba": proba}
+    return oof
+
+
+def cross_validate(models, X, Y, K=5, workers=None, return_oof=False):
+    if not sparse.issparse(X):
+        X = np.ascontiguousarray(X.to_numpy() if hasattr(X, "to_numpy") else X)
+    Y = np.ascontiguousarray(Y.to_numpy() if hasattr(Y, "to_numpy") else Y)
+    folds = kfold_indices(X.shape[0], K)
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(X, Y)) as pool:
+        jobs = {
+            (name, i): pool.submit(run_fold, clone(model), train_idx, test_idx)
+            for i, (train_idx, test_idx) in enumerate(folds)
+            for name, model in models.items()
+        }
+        results = {key: job.result() for key, job in jobs.items()}
+
+    df_results = pd.DataFrame({
+        'accuracy': [np.mean([results[name, i][0][0] for i in range(K)]) for name in models],
+        'precision': [np.mean([results[name, i][0][1] for i in range(K)]) for name in models],
+        'recall': [np.mean([results[name, i][0][2] for i in range(K)]) for name in models]
+    }, index=list(models.keys()))
+    if return_oof:
+        return df_results, out_of_fold(results, folds, models, X.shape[0])
+    return df_results
+
+
+# ----- Step 12: Entrenar con todos los datos y guardar ----- #
+def train_and_save(K=5, models_dir=ms.MODELS_DIR, workers=None, params=None):
+    legitimate_df, phishing_df = load_datasets(urls=False)
+    df, X, Y = prepare_data(legitimate_df, phishing_df)
+    # Sin params explícitos se usan los de la última búsqueda, si la hay
+    tuning_version = None
+    if params is None:
+        params, tuning_version = tuned_params(models_dir)
+
+    # (Los antiguos Step 3 y 5 entrenaban cada modelo con un split 80/20 y
+    # tiraban el resultado; la evaluación es sólo la validación cruzada.)
+    df_results, oof = cross_validate(create_models(params), X, Y, K, workers, return_oof=True)
+
+    train_hash = ms.data_hash(df)
+    for name, model in create_models(params).items():
+        model.fit(X, Y)
+        ms.save_model(name, model, fr.FEATURE_NAMES, train_hash,
+                      cv_metrics=df_results.loc[name].to_dict(),
+                      extra={"cv_folds": K, "train_rows": int(X.shape[0]),
+                             "tuned_params": params.get(name, {}), "tuning_version": tuning_version},
+                      models_dir=models_dir)
+
+    # Cascada: umbrales del modelo barato calibrados con las predicciones CV
+    config = cascade.calibrate(oof, Y.to_numpy())
+    cascade.save_cascade(config, models_dir)
+    return df_results
+
+
+# ----- Entrenamiento con el bloque disperso (python machine_learning.py --hashed) ----- #
+def hashed_matrix(X, hashed):
+    # Las 22 columnas densas seguidas del bloque disperso, en CSR
+    dense = sparse.csr_matrix(X.to_numpy(dtype=np.float32) if hasattr(X, "to_numpy") else X)
+    return sparse.hstack([dense, hashed], format="csr")
+
+
+def train_hashed(K=5, models_dir=ms.MODELS_DIR, workers=None, params=None):
+    legitimate_df, phishing_df = load_datasets(urls=True)
+    df, X, Y, hashed = prepare_hashed_data(legitimate_df, phishing_df)
+    tuning_version = None
+    if params is None:
+        params, tuning_version = tuned_params(models_dir)
+
+    models = {name: model for name, model in create_models(params).items() if name in SPARSE_MODELS}
+    X_all = hashed_matrix(X, hashed)
+    df_results = cross_validate(models, X_all, Y, K, workers)
+
+    train_hash = ms.data_hash(df)
+    block = {"n_features": int(hashed.shape[1]), "namespaces": list(sf.NAMESPACES),
+             "nnz": int(hashed.nnz), "rows_with_tokens": int((hashed.getnnz(axis=1) > 0).sum())}
     for name, model in models.items():
-        model.fit(X_train_list[i], Y_train_list[i])
-        pred = model.predict(X_test_list[i])
-        tn, fp, fn, tp = confusion_matrix(Y_test_list[i], pred).ravel()
-        acc, prec, rec = calculate_measures(tn, tp, fn, fp)
-        results_acc[name].append(acc)
-        results_prec[name].append(prec)
-        results_rec[name].append(rec)
-
-# ----- Step 10: Promediar resultados ----- #
-df_results = pd.DataFrame({
-    'accuracy': [np.mean(results_acc[name]) for name in models],
-    'precision': [np.mean(results_prec[name]) for name in models],
-    'recall': [np.mean(results_rec[name]) for name in models]
-}, index=list(models.keys()))
-
-# ----- Step 11: Mostrar métricas en consola ----- #
-for name in models:
-    print(f"{name} - Accuracy: {np.mean(results_acc[name]):.3f}, "
-          f"Precision: {np.mean(results_prec[name]):.3f}, "
-          f"Recall: {np.mean(results_rec[name]):.3f}")
+        model.fit(X_all, Y)
+        ms.save_model(name + HASHED_SUFFIX, model, fr.FEATURE_NAMES, train_hash,
+                      cv_metrics=df_results.loc[name].to_dict(),
+                      extra={"cv_folds": K, "train_rows": int(X_all.shape[0]), "hashed_block": block,
+                             "tuned_params": params.get(name, {}), "tuning_version": tuning_version},
+                      models_dir=models_dir)
+    return df_results
+
+
+if __name__ == "__main__":
+    if "--hashed" in sys.argv:
+        df_results = train_hashed()
+        for name, row in df_results.iterrows():
+            print(f"{name}{HASHED_SUFFIX} - Accuracy: {row['accuracy']:.3f}, "
+                  f"Precision: {row['precision']:.3f}, "
+                  f"Recall: {row['recall']:.3f}")
+        print(f"Models saved in {ms.MODELS_DIR}/")
+    else:
+        df_results = train_and_save()
+
+        # ----- Step 11: Mostrar métricas en consola ----- #
+        for name, row in df_results.iterrows():
+            print(f"{name} - Accuracy: {row['accuracy']:.3f}, "
+                  f"Precision: {row['precision']:.3f}, "
+                  f"Recall: {row['recall']:.3f}")
+        config = ms.load_metadata(cascade.CASCADE_KEY)
+        print(f"Cascade {' -> '.join(config['stages'])} -> vote({', '.join(config['ensemble'])}): "
+              f"accuracy {config['cv_metrics']['accuracy']:.3f}, "
+              f"{config['cv_metrics']['early_exit']:.0%} decided by the first stage")
+        print(f"Models saved in {ms.MODELS_DIR}/")
@@ -0,0 +1,186 @@
+# -----------------------------
+# Almacén de modelos entrenados
+# -----------------------------
+# Cada entrenamiento guarda una versión nueva de cada modelo:
+#
+#   models/<KEY>/v0001.joblib      el estimador (joblib, como los *_model.pkl)
+#   models/<KEY>/v0001.json        metadatos: esquema de características, hash
+#                                  de los datos de entrenamiento, métricas CV...
+#   models/<KEY>/v0001.trees.npz   árboles aplanados (sólo DT/RF/AB, ver
+#                                  tree_predictor.py): se cargan sin sklearn
+#   models/<KEY>/LATEST            número de la última versión
+#
+# Los metadatos van aparte para poder leerlos sin cargar el modelo.
+
+import os
+import json
+import time
+import hashlib
+import joblib
+import pandas as pd
+import feature_registry as fr
+import tree_predictor
+
+
+MODELS_DIR = "models"
+
+# Clave corta (la de machine_learning.py) -> nombre mostrado en app.py
+MODEL_NAMES = {
+    "NB": "Gaussian Naive Bayes",
+    "SVM": "Support Vector Machine",
+    "DT": "Decision Tree",
+    "RF": "Random Forest",
+    "AB": "AdaBoost",
+    "NN": "Neural Network",
+    "KN": "K-Neighbours",
+}
+
+# Ficheros sueltos que había antes del almacén (nb_model.pkl, ...)
+LEGACY_FILES = {key: f"{key.lower()}_model.pkl" for key in MODEL_NAMES}
+
+
+def data_hash(df):
+    # Huella de los datos de entrenamiento (independiente del orden de columnas)
+    df = df.reindex(sorted(df.columns), axis=1)
+    values = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha256(values.tobytes()).hexdigest()[:16]
+
+
+def model_dir(key, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, key)
+
+
+def latest_version(key, models_dir=MODELS_DIR):
+    path = os.path.join(model_dir(key, models_dir), "LATEST")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return int(f.read().strip())
+
+
+def artifact_paths(key, version, models_dir=MODELS_DIR):
+    base = os.path.join(model_dir(key, models_dir), f"v{version:04d}")
+    return base + ".joblib", base + ".json"
+
+
+def compiled_path(key, version, models_dir=MODELS_DIR):
+    return os.path.join(model_dir(key, models_dir), f"v{version:04d}") + tree_predictor.SUFFIX
+
+
+def write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def next_version(key, models_dir=MODELS_DIR):
+    os.makedirs(model_dir(key, models_dir), exist_ok=True)
+    return (latest_version(key, models_dir) or 0) + 1
+
+
+def save_metadata(key, metadata, models_dir=MODELS_DIR, version=None):
+    # Guarda una versión nueva con estos metadatos y la marca como la última.
+    # version: la ya reservada con next_version si antes se escribieron
+    # artefactos (el .joblib de save_model); si no, la siguiente
+    version = version or next_version(key, models_dir)
+    metadata = {"key": key, "version": version, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                **metadata}
+    _, metadata_path = artifact_paths(key, version, models_dir)
+    write_atomic(metadata_path, json.dumps(metadata, indent=2))
+    # LATEST se escribe al final: una versión a medias nunca es la última
+    write_atomic(os.path.join(model_dir(key, models_dir), "LATEST"), str(version))
+    return metadata
+
+
+def save_model(key, model, features, train_hash, cv_metrics=None, extra=None, models_dir=MODELS_DIR):
+    import sklearn  # sólo al entrenar: importar sklearn cuesta ~1 s
+
+    version = next_version(key, models_dir)
+    model_path, _ = artifact_paths(key, version, models_dir)
+
+    metadata = {
+        "name": MODEL_NAMES.get(key, key),
+        "estimator": type(model).__name__,
+        "params": {k: repr(v) for k, v in model.get_params().items()},
+        "sklearn_version": sklearn.__version__,
+        "schema_version": fr.SCHEMA_VERSION,
+        "schema_fingerprint": fr.schema_fingerprint(features),
+        "features": list(features),
+        "train_data_hash": train_hash,
+        "cv_metrics": cv_metrics or {},
+    }
+    metadata.update(extra or {})
+
+    joblib.dump(model, model_path)
+    if tree_predictor.supports(model):
+        tree_predictor.export(model, compiled_path(key, version, models_dir))
+    return save_metadata(key, metadata, models_dir, version)
+
+
+def load_metadata(key, version=None, models_dir=MODELS_DIR):
+    version = version or latest_version(key, models_dir)
+    if version is None:
+        return None
+    _, metadata_path = artifact_paths(key, version, models_dir)
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_schema(metadata):
+    # Falla si el modelo se entrenó con otra definición de características
+    expected = fr.schema_fingerprint(metadata["features"])
+    if metadata["schema_fingerprint"] != expected:
+        raise ValueError(
+            f"Model {metadata['key']} v{metadata['version']} was trained with feature schema "
+            f"v{metadata['schema_version']}, current schema is v{fr.SCHEMA_VERSION}"
+        )
+
+
+def load_model(key, version=None, models_dir=MODELS_DIR, compiled=False):
+    # compiled=True: si hay árboles aplanados se usan en lugar del estimador
+    # (mismas predicciones, sin importar sklearn)
+    metadata = load_metadata(key, version, models_dir)
+    if metadata is None:
+        return load_legacy_model(key)
+    check_schema(metadata)
+    path = compiled_path(key, metadata["version"], models_dir)
+    if compiled and os.path.exists(path):
+        return tree_predictor.load(path), metadata
+    model_path, _ = artifact_paths(key, metadata["version"], models_dir)
+    return joblib.load(model_path), metadata
+
+
+def load_legacy_model(key):
+    model = joblib.load(LEGACY_FILES[key])
+    features = fr.model_features(model)
+    metadata = {
+        "key": key,
+        "name": MODEL_NAMES.get(key, key),
+        "version": 0,
+        "legacy": True,
+        "features": features,
+        "schema_version": fr.SCHEMA_VERSION,
+        "schema_fingerprint": fr.schema_fingerprint(features),
+        "cv_metrics": {},
+    }
+    return model, metadata
+
+
+def predict_with_proba(model, X):
+    # (clases, probabilidad de phishing o None). Con predict_proba la clase
+    # sale de las probabilidades: una sola pasada por el modelo
+    if not hasattr(model, "predict_proba"):
+        return model.predict(X), None
+    proba = model.predict_proba(X)
+    return model.classes_.take(proba.argmax(axis=1)), proba[:, 1]
+
+
+def cv_results(models_dir=MODELS_DIR):
+    # Tabla accuracy/precision/recall de la última versión de cada modelo
+    rows = {}
+    for key in MODEL_NAMES:
+        metadata = load_metadata(key, models_dir=models_dir)
+        if metadata and metadata.get("cv_metrics"):
+            rows[key] = metadata["cv_metrics"]
+    return pd.DataFrame.from_dict(rows, orient="index")
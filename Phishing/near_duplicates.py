@@ -0,0 +1,197 @@
+# -----------------------------
+# Detección de casi-duplicados (MinHash + LSH)
+# -----------------------------
+# Un mismo kit de phishing aparece clonado en cientos de dominios. Sólo
+# cambian unas pocas URLs o textos, así que drop_duplicates() sobre los
+# vectores (datasets.py) llega tarde: la página ya se ha parseado, extraído
+# y guardado. Aquí se detectan los clones justo después de la descarga:
+#
+# - signature(body): MinHash de NUM_PERM valores sobre los shingles de
+#   SHINGLE tokens alfanuméricos (sólo los primeros SIGNATURE_BYTES)
+# - NearDuplicateIndex: índice en memoria con BANDS bandas LSH; las firmas
+#   que coinciden en alguna banda se comparan enteras y si la similitud de
+#   Jaccard estimada es >= THRESHOLD la página es un clon
+#
+# Los recolectores no extraen ni archivan los clones: sólo apuntan
+# (URL, URL original, similitud) en index.duplicates.
+
+import os
+import re
+import json
+import zlib
+import numpy as np
+
+
+NUM_PERM = 128
+BANDS = 32                 # 32 bandas de 4 valores
+SHINGLE = 4                # tokens por shingle
+THRESHOLD = 0.85           # Jaccard estimada mínima para considerar clon
+SIGNATURE_BYTES = 256 * 1024
+MIN_SHINGLES = 20          # páginas más cortas (errores, redirecciones) no se comparan
+SEED = 1
+SIGNATURE_SIZE = NUM_PERM * 4   # bytes de una firma en disco
+
+TOKEN = re.compile(rb"[A-Za-z0-9]+")
+
+# Hash universal multiply-shift: (a * x + b) >> 32 con aritmética de 64 bits.
+# Fijos (semilla constante): las firmas calculadas en distintos procesos son
+# comparables
+_rng = np.random.default_rng(SEED)
+_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_CHUNK = 16   # permutaciones por bloque: acota la matriz intermedia
+
+
+def shingles(body, max_bytes=SIGNATURE_BYTES):
+    tokens = TOKEN.findall(body[:max_bytes].lower())
+    if len(tokens) < SHINGLE:
+        return np.empty(0, dtype=np.uint64)
+    h = np.fromiter(map(zlib.crc32, tokens), dtype=np.uint64, count=len(tokens))
+    # Hash de cada ventana de SHINGLE tokens (polinómico, desbordamiento a 2^64)
+    n = len(h) - SHINGLE + 1
+    combined = h[:n].copy()
+    for j in range(1, SHINGLE):
+        combined = combined * _MULTIPLIER + h[j:j + n]
+    return np.unique(combined)
+
+
+def signature(body, max_bytes=SIGNATURE_BYTES):
+    # None si la página es demasiado corta para compararla
+    values = shingles(body, max_bytes)
+    if len(values) < MIN_SHINGLES:
+        return None
+    out = np.empty(NUM_PERM, dtype=np.uint32)
+    for start in range(0, NUM_PERM, _CHUNK):
+        a, b = _A[start:start + _CHUNK, None], _B[start:start + _CHUNK, None]
+        out[start:start + _CHUNK] = ((a * values + b) >> np.uint64(32)).min(axis=1)
+    return out
+
+
+def similarity(sig_a, sig_b):
+    # Fracción de valores iguales: estimación de la similitud de Jaccard
+    return float(np.mean(sig_a == sig_b))
+
+
+class NearDuplicateIndex:
+
+    def __init__(self, threshold=THRESHOLD, bands=BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.buckets = [{} for _ in range(bands)]   # clave de banda -> ids
+        self.signatures = []
+        self.urls = []
+        self.duplicates = []   # (URL, URL original, similitud) pendientes de guardar
+
+    def __len__(self):
+        return len(self.urls)
+
+    def _keys(self, sig):
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def query(self, sig):
+        # Original más parecido por encima del umbral: (id, similitud) o None
+        candidates = set()
+        for bucket, key in zip(self.buckets, self._keys(sig)):
+            candidates.update(bucket.get(key, ()))
+        best = None
+        for doc in candidates:
+            score = similarity(sig, self.signatures[doc])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (doc, score)
+        return best
+
+    def add(self, sig, url):
+        doc = len(self.signatures)
+        self.signatures.append(sig)
+        self.urls.append(url)
+        for bucket, key in zip(self.buckets, self._keys(sig)):
+            bucket.setdefault(key, []).append(doc)
+        return doc
+
+    def check(self, url, sig):
+        # URL original si la página es un clon (y se apunta); si no, se añade
+        # al índice y devuelve None. Consulta y alta van juntas para que dos
+        # clones en vuelo a la vez no pasen ambos como originales
+        if sig is None:
+            return None
+        match = self.query(sig)
+        # Tras reanudar un shard la misma URL puede estar ya en el índice
+        if match is not None and self.urls[match[0]] != url:
+            original = self.urls[match[0]]
+            self.duplicates.append((url, original, round(match[1], 3)))
+            return original
+        self.add(sig, url)
+        return None
+
+    def drain(self):
+        duplicates, self.duplicates = self.duplicates, []
+        return duplicates
+
+    # ----- Persistencia (checkpoints de sharded_collection.py) ----- #
+    # <path>.sigs: firmas uint32 seguidas; <path>.urls: una URL (JSON) por
+    # línea. Cada save sólo añade lo nuevo desde el anterior: el checkpoint
+    # guarda cuántas entradas hay confirmadas y load recorta lo posterior
+    def save(self, path, saved=0):
+        # Añade las entradas [saved:] (con saved=0 reescribe los ficheros) y
+        # devuelve cuántas hay guardadas
+        sig_path, url_path = index_paths(path)
+        mode = "ab" if saved else "wb"
+        with open(sig_path, mode) as f:
+            f.write(np.array(self.signatures[saved:], dtype=np.uint32).reshape(-1, NUM_PERM).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(url_path, mode) as f:
+            f.write("".join(json.dumps(url) + "\n" for url in self.urls[saved:]).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        return len(self.signatures)
+
+    @classmethod
+    def load(cls, path, count, threshold=THRESHOLD, bands=BANDS):
+        sig_path, url_path = index_paths(path)
+        urls, end = [], 0
+        with open(url_path, "rb") as f:
+            for line in f:
+                if len(urls) == count or not line.endswith(b"\n"):
+                    break
+                urls.append(json.loads(line))
+                end += len(line)
+        if len(urls) < count or os.path.getsize(sig_path) < count * SIGNATURE_SIZE:
+            raise ValueError(f"{path}: the index has fewer than the {count} entries in the checkpoint")
+        os.truncate(url_path, end)
+        os.truncate(sig_path, count * SIGNATURE_SIZE)
+
+        index = cls(threshold, bands)
+        signatures = np.fromfile(sig_path, dtype=np.uint32).reshape(-1, NUM_PERM)
+        for sig, url in zip(signatures, urls):
+            index.add(sig, url)
+        return index
+
+
+def index_paths(path):
+    return path + ".sigs", path + ".urls"
+
+
+if __name__ == "__main__":
+    # Clones de las páginas de mini_dataset: mismo HTML con otras URLs y un
+    # texto distinto; deben detectarse todos y ninguna página original
+    import time
+    import local_server
+
+    pages = local_server.load_pages()
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    originals = [index.check(f"https://site{i}.example/", signature(page)) for i, page in enumerate(pages)]
+    clones = []
+    for i, page in enumerate(pages):
+        clone = page.replace(b"https://", b"https://kit-clone-7.example/").replace(b"<title>", b"<title>Verify ")
+        clones.append(index.check(f"https://clone{i}.example/", signature(clone)))
+    elapsed = time.perf_counter() - start
+
+    print("originals flagged as clones:", sum(o is not None for o in originals))
+    print("clones detected:", sum(c is not None for c in clones), "/", len(pages))
+    for url, original, score in index.drain():
+        print(f"  {url} -> {original} ({score})")
+    print(f"{2 * len(pages)} signatures in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,325 @@
+# -----------------------------
+# Pipeline productor/consumidor para la recolección
+# -----------------------------
+# data_collector.create_structured_data descarga, parsea y extrae en un
+# mismo bucle y acumula las filas en data_list hasta el final. Aquí cada
+# etapa va por separado, unidas por colas acotadas:
+#
+#   URLs --[urls]--> fetch (hilos) --[fetched]--> dispatch --[extracted]--> write
+#                                                     |                      ^
+#                                                     +-- pool de procesos --+
+#
+# - fetch: FETCH_WORKERS hilos con su propia requests.Session (I/O)
+# - dispatch: un hilo; casi-duplicados y caché de características, y envía
+#   el parseo + extracción al pool de procesos (CPU)
+# - write: el hilo que llama a run(); escribe cada fila en cuanto está (en
+#   el orden en que terminaron las descargas), archiva y guarda en la caché
+# Los pasos de cada página son los de collector_steps.py, como en los otros
+# dos motores.
+#
+# Todas las colas tienen tamaño máximo: si el pool o la escritura van más
+# lentos, las etapas anteriores se bloquean (backpressure) y la memoria no
+# depende del número de URLs. run() devuelve, por etapa, elementos,
+# elementos/s, ocupación (tiempo ocupado / (hilos x tiempo total)) y
+# profundidad media de su cola de entrada.
+#
+#   python pipeline.py urls.csv --output out.csv [--fetch-workers 32] [--queue 64]
+#   python pipeline.py local --urls 400 --output out.csv   (contra local_server.py)
+#
+# En sharded_collection.py es el motor "pipeline" (data_collector.collector_engine).
+
+import os
+import sys
+import csv
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import requests
+import feature_extraction as fe
+import feature_registry as fr
+import collector_steps as steps
+import fetcher
+import near_duplicates as nd
+import instrumentation as inst
+
+
+FETCH_WORKERS = 32
+QUEUE_SIZE = 64           # elementos como máximo en cada cola
+MONITOR_INTERVAL = 0.05   # segundos entre muestras de profundidad de las colas
+FLUSH_EVERY = 100         # filas entre flush() del fichero de salida
+
+_DONE = object()
+
+
+class StageStats:
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds, items=1):
+        with self.lock:
+            self.items += items
+            self.busy += seconds
+        inst.observe(f"pipeline.{self.name}", seconds * 1000)
+
+
+class QueueMonitor:
+    # Hilo que muestrea la longitud de cada cola cada MONITOR_INTERVAL
+
+    def __init__(self, queues, interval=MONITOR_INTERVAL):
+        self.queues = queues
+        self.interval = interval
+        self.samples = {name: [] for name in queues}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for name, q in self.queues.items():
+                self.samples[name].append(q.qsize())
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def depth(self, name):
+        samples = self.samples[name]
+        return (sum(samples) / len(samples), max(samples)) if samples else (0.0, 0)
+
+
+# ----- Etapas ----- #
+def feed(url_list, urls, n_fetchers):
+    try:
+        for item in enumerate(url_list):
+            urls.put(item)
+    finally:
+        # Aunque url_list falle, los hilos de fetch tienen que terminar
+        for _ in range(n_fetchers):
+            urls.put(_DONE)
+
+
+def guarded(target, errors):
+    # Un fallo inesperado en un hilo se apunta y run() lo relanza
+    def run_target(*args):
+        try:
+            target(*args)
+        except BaseException as e:
+            errors.append(e)
+            raise
+    return run_target
+
+
+def fetch_stage(urls, fetched, stats, max_bytes, dedup):
+    session = requests.Session()
+    try:
+        fetch_loop(urls, fetched, stats, max_bytes, dedup, session)
+    finally:
+        # Aunque el hilo falle, dispatch tiene que saber que ha terminado
+        fetched.put(_DONE)
+
+
+def fetch_loop(urls, fetched, stats, max_bytes, dedup, session):
+    while True:
+        item = urls.get()
+        if item is _DONE:
+            return
+        i, url = item
+        start = time.perf_counter()
+        record = {"i": i, "url": url, "page": None, "signature": None, "error": None}
+        try:
+            record["page"] = fetcher.fetch_body(url, session=session, max_bytes=max_bytes)
+            if dedup and record["page"].status == 200:
+                # En este hilo, no en el de dispatch: así se reparte entre los de fetch
+                record["signature"] = nd.signature(record["page"].body)
+        except requests.exceptions.RequestException as e:
+            record["error"] = e
+        stats.add(time.perf_counter() - start)
+        fetched.put(record)
+
+
+def extract_job(body, backend, encoding, features):
+    # Se ejecuta en el pool de procesos
+    start = time.perf_counter()
+    vector = fe.create_vector(body, backend=backend, encoding=encoding, features=features)
+    return vector, time.perf_counter() - start
+
+
+def dispatch_stage(fetched, extracted, stats, n_fetchers, executor, backend, dedup, cache):
+    try:
+        dispatch_loop(fetched, extracted, stats, n_fetchers, executor, backend, dedup, cache)
+    finally:
+        extracted.put(_DONE)
+
+
+def dispatch_loop(fetched, extracted, stats, n_fetchers, executor, backend, dedup, cache):
+    remaining = n_fetchers
+    while remaining:
+        record = fetched.get()
+        if record is _DONE:
+            remaining -= 1
+            continue
+        start = time.perf_counter()
+        page = record["page"]
+        if page is not None and page.status == 200:
+            record["duplicate"] = steps.is_duplicate(dedup, record["i"], record["url"], record["signature"])
+            if not record["duplicate"]:
+                record["sha"], record["known"], record["missing"] = steps.lookup(cache, page.body)
+                if record["missing"]:
+                    record["future"] = executor.submit(extract_job, page.body, backend, page.encoding,
+                                                       record["missing"])
+        stats.add(time.perf_counter() - start)
+        # El escritor espera a cada futuro en el orden de esta cola
+        extracted.put(record)
+
+
+def write_record(record, writer, stats, extract_stats, archive, cache):
+    # Devuelve True si se ha escrito una fila (pasos en collector_steps.py)
+    i, url, page = record["i"], record["url"], record["page"]
+    if record["error"] is not None:
+        steps.failed(i, record["error"])
+        return False
+    if record.get("duplicate"):
+        return False
+    if not steps.keep_page(i, url, page.status, page.headers, page.body, archive):
+        return False
+
+    values = []
+    if "future" in record:
+        values, seconds = record["future"].result()
+        extract_stats.add(seconds)
+    row = steps.finish(url, record["sha"], record["known"], record["missing"], values, cache)
+    start = time.perf_counter()
+    writer.writerow(row)
+    stats.add(time.perf_counter() - start)
+    return True
+
+
+def run(url_list, writer, backend=fe.DEFAULT_BACKEND, fetch_workers=FETCH_WORKERS, executor=None,
+        extract_workers=None, queue_size=QUEUE_SIZE, max_bytes=fetcher.MAX_BYTES, archive=None,
+        dedup=None, cache=None, out=None):
+    # writer: csv.writer (o cualquier objeto con writerow) de la salida
+    # out: fichero bajo el writer, para hacer flush() cada FLUSH_EVERY filas
+    # executor: pool de procesos de extract_workers procesos; se crea uno si no se pasa
+    extract_workers = extract_workers or os.cpu_count() or 1
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(extract_workers)
+
+    urls = queue.Queue(queue_size)
+    fetched = queue.Queue(queue_size)
+    extracted = queue.Queue(queue_size)   # acota también los trabajos en vuelo en el pool
+    stats = {
+        "fetch": StageStats("fetch", fetch_workers),
+        "dispatch": StageStats("dispatch", 1),
+        "extract": StageStats("extract", extract_workers),
+        "write": StageStats("write", 1),
+    }
+    monitor = QueueMonitor({"fetch": urls, "dispatch": fetched, "write": extracted}).start()
+
+    errors = []
+    threads = [threading.Thread(target=guarded(feed, errors), args=(url_list, urls, fetch_workers), daemon=True)]
+    threads += [threading.Thread(target=guarded(fetch_stage, errors), daemon=True,
+                                 args=(urls, fetched, stats["fetch"], max_bytes, dedup is not None))
+                for _ in range(fetch_workers)]
+    threads.append(threading.Thread(target=guarded(dispatch_stage, errors), daemon=True,
+                                    args=(fetched, extracted, stats["dispatch"], fetch_workers,
+                                          executor, backend, dedup, cache)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    rows = 0
+    try:
+        while True:
+            record = extracted.get()
+            if record is _DONE:
+                break
+            if write_record(record, writer, stats["write"], stats["extract"], archive, cache):
+                rows += 1
+                if out is not None and rows % FLUSH_EVERY == 0:
+                    out.flush()
+        if errors:
+            raise errors[0]
+        for thread in threads:
+            thread.join()
+    finally:
+        monitor.stop()
+        if own_executor:
+            executor.shutdown()
+    if out is not None:
+        out.flush()
+
+    wall = time.perf_counter() - start
+    return rows, report(stats, monitor, wall)
+
+
+def report(stats, monitor, wall):
+    rows = {}
+    for name, stage in stats.items():
+        depth = monitor.depth(name) if name in monitor.queues else (None, None)
+        rows[name] = {
+            "workers": stage.workers,
+            "items": stage.items,
+            "items_per_s": round(stage.items / wall, 2) if wall else None,
+            "busy_s": round(stage.busy, 3),
+            "occupancy": round(stage.busy / (stage.workers * wall), 3) if wall else None,
+            "queue_mean": round(depth[0], 1) if depth[0] is not None else None,
+            "queue_max": depth[1],
+        }
+    return {"wall_s": round(wall, 3), "stages": rows}
+
+
+def format_report(result):
+    lines = [f"{'stage':10s} {'workers':>7s} {'items':>7s} {'items/s':>9s} {'busy s':>8s} "
+             f"{'occupancy':>9s} {'queue':>11s}"]
+    for name, row in result["stages"].items():
+        queue_text = f"{row['queue_mean']}/{row['queue_max']}" if row["queue_max"] is not None else "-"
+        lines.append(f"{name:10s} {row['workers']:7d} {row['items']:7d} {row['items_per_s']:9.1f} "
+                     f"{row['busy_s']:8.2f} {row['occupancy']:9.0%} {queue_text:>11s}")
+    lines.append(f"total {result['wall_s']:.2f}s (queue = mean/max depth of the stage's input queue)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import url_source
+
+    parser = argparse.ArgumentParser(description="Staged fetch/extract/write collection")
+    parser.add_argument("source", help="URL file (PhishTank/Tranco CSV) or 'local' for local_server.py")
+    parser.add_argument("--output", required=True, help="output CSV")
+    parser.add_argument("--backend", default=fe.DEFAULT_BACKEND, choices=fe.BACKENDS)
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS)
+    parser.add_argument("--extract-workers", type=int, default=None)
+    parser.add_argument("--queue", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--urls", type=int, default=400, help="number of URLs with 'local'")
+    parser.add_argument("--delay", type=float, default=0.05, help="server delay with 'local'")
+    args = parser.parse_args()
+
+    server = None
+    if args.source == "local":
+        import local_server
+        server, base_url = local_server.start_server(delay=args.delay)
+        url_list = local_server.page_urls(base_url, args.urls)
+    else:
+        url_list = url_source.iter_urls(args.source, dedup_hosts=False)
+
+    try:
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out)
+            writer.writerow(fr.FEATURE_NAMES + ["URL"])
+            rows, result = run(url_list, writer, args.backend, args.fetch_workers,
+                               extract_workers=args.extract_workers, queue_size=args.queue, out=out)
+    finally:
+        if server is not None:
+            server.shutdown()
+    print(f"{rows} rows written", file=sys.stderr)
+    print(format_report(result), file=sys.stderr)
@@ -0,0 +1,319 @@
+# -----------------------------
+# Servicio HTTP de puntuación con micro-batching
+# -----------------------------
+# Mantiene los modelos de model_store.py cargados en memoria y puntúa una
+# URL o un HTML en crudo:
+#
+#   POST /score    {"url": "..."} | {"html": "..."}   (opcional "model": "RF")
+#   GET  /metrics  peticiones, errores, tamaño medio de lote y latencias p50/p99
+#   GET  /health
+#
+# Las peticiones concurrentes se agrupan durante MAX_WAIT_MS (o hasta
+# MAX_BATCH filas) y el modelo hace un único predict por lote. La
+# extracción de características va a un pool de procesos.
+#
+#   python scoring_service.py --models RF NB --port 8080
+#   python scoring_service.py --selftest      (sólo con mini_dataset y local_server)
+
+import time
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import aiohttp
+from aiohttp import web
+import feature_extraction as fe
+import feature_registry as fr
+import model_store as ms
+import cascade
+import fetcher
+import async_collector
+
+
+MAX_BATCH = 64
+MAX_WAIT_MS = 5
+LATENCY_WINDOW = 10_000   # últimas N latencias para los percentiles
+
+
+def extract(page, backend, features, encoding=None):
+    # Se ejecuta en un proceso del pool
+    return fe.create_vector(page, backend=backend, features=features, encoding=encoding)
+
+
+class LatencyRecorder:
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def add(self, ms):
+        self.samples.append(ms)
+
+    def summary(self):
+        if not self.samples:
+            return {"count": 0, "p50_ms": None, "p99_ms": None}
+        values = np.fromiter(self.samples, dtype=float)
+        return {
+            "count": len(values),
+            "p50_ms": round(float(np.percentile(values, 50)), 3),
+            "p99_ms": round(float(np.percentile(values, 99)), 3),
+        }
+
+
+class MicroBatcher:
+
+    def __init__(self, model, features, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.features = features
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.rows = 0
+
+    async def predict(self, vector):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((vector, future))
+        return await future
+
+    def _predict(self, vectors):
+        X = pd.DataFrame(vectors, columns=self.features)
+        return ms.predict_with_proba(self.model, X)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            start = time.perf_counter()
+            try:
+                predictions, probabilities = await loop.run_in_executor(
+                    None, self._predict, [vector for vector, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    # Si el cliente se ha ido su future ya está cancelado
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            predict_ms = (time.perf_counter() - start) * 1000
+
+            self.batches += 1
+            self.rows += len(batch)
+            for i, (_, future) in enumerate(batch):
+                if not future.done():
+                    probability = float(probabilities[i]) if probabilities is not None else None
+                    future.set_result((int(predictions[i]), probability, predict_ms, len(batch)))
+
+
+class ScoringService:
+
+    def __init__(self, model_keys, backend="stream", workers=None,
+                 max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, models_dir=ms.MODELS_DIR):
+        self.backend = backend
+        self.models = {}
+        self.batchers = {}
+        for key in model_keys:
+            model, metadata = cascade.load_model(key, models_dir=models_dir, compiled=True)
+            features = fr.model_features(model)
+            self.models[key] = metadata
+            self.batchers[key] = MicroBatcher(model, features, max_batch, max_wait_ms)
+        self.default_model = model_keys[0]
+        self.workers = workers
+        self.latency = LatencyRecorder()
+        self.stage_latency = {stage: LatencyRecorder() for stage in ("fetch", "extract", "predict")}
+        self.requests = 0
+        self.errors = 0
+
+    # ----- ciclo de vida ----- #
+    async def start(self, app):
+        self.executor = ProcessPoolExecutor(self.workers)
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=4, ssl=False)
+        timeout = aiohttp.ClientTimeout(sock_connect=fetcher.TIMEOUT, sock_read=fetcher.TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self.tasks = [asyncio.create_task(batcher.run()) for batcher in self.batchers.values()]
+
+    async def stop(self, app):
+        for task in self.tasks:
+            task.cancel()
+        await self.session.close()
+        self.executor.shutdown()
+
+    # ----- puntuación ----- #
+    async def fetch(self, url):
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                raise web.HTTPBadGateway(text=f"HTTP {response.status} fetching {url}")
+            charset = fetcher.check_content_type(response.headers)
+            body = await async_collector.read_bounded(response, fetcher.MAX_BYTES)
+            return body, charset
+
+    @staticmethod
+    async def read_payload(request):
+        # Errores del cliente (400), antes de descargar o puntuar nada
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Body must be valid JSON")
+        if not isinstance(payload, dict):
+            raise web.HTTPBadRequest(text="Body must be a JSON object")
+        for field in ("url", "html", "model"):
+            if field in payload and not isinstance(payload[field], str):
+                raise web.HTTPBadRequest(text=f"'{field}' must be a string")
+        return payload
+
+    async def score(self, payload):
+        key = payload.get("model", self.default_model)
+        if key not in self.batchers:
+            raise web.HTTPBadRequest(text=f"Model not loaded: {key}")
+        batcher = self.batchers[key]
+        timings = {}
+
+        start = time.perf_counter()
+        if "html" in payload:
+            page, charset = payload["html"], None
+        elif "url" in payload:
+            try:
+                page, charset = await self.fetch(payload["url"])
+            except (aiohttp.ClientError, asyncio.TimeoutError, fetcher.ContentRejected, ValueError) as e:
+                raise web.HTTPBadGateway(text=str(e))
+        else:
+            raise web.HTTPBadRequest(text="Expected 'url' or 'html'")
+        timings["fetch_ms"] = (time.perf_counter() - start) * 1000
+
+        t = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        vector = await loop.run_in_executor(self.executor, extract, page, self.backend, batcher.features, charset)
+        timings["extract_ms"] = (time.perf_counter() - t) * 1000
+
+        prediction, probability, predict_ms, batch_size = await batcher.predict(vector)
+        timings["predict_ms"] = predict_ms
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+
+        for stage in ("fetch", "extract", "predict"):
+            self.stage_latency[stage].add(timings[stage + "_ms"])
+        return {
+            "prediction": prediction,
+            "label": "phishing" if prediction == 1 else "legitimate",
+            "probability": probability,
+            "model": key,
+            "model_version": self.models[key]["version"],
+            "batch_size": batch_size,
+            "timings": {k: round(v, 3) for k, v in timings.items()},
+        }
+
+    # ----- handlers ----- #
+    async def handle_score(self, request):
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            result = await self.score(await self.read_payload(request))
+        except web.HTTPException:
+            self.errors += 1
+            raise
+        self.latency.add((time.perf_counter() - start) * 1000)
+        return web.json_response(result)
+
+    async def handle_metrics(self, request):
+        return web.json_response({
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": self.latency.summary(),
+            "stages": {stage: rec.summary() for stage, rec in self.stage_latency.items()},
+            "batches": {
+                key: {"batches": b.batches, "rows": b.rows,
+                      "mean_batch_size": round(b.rows / b.batches, 2) if b.batches else None}
+                for key, b in self.batchers.items()
+            },
+        })
+
+    async def handle_health(self, request):
+        return web.json_response({"status": "ok", "models": {k: m["version"] for k, m in self.models.items()}})
+
+
+def create_app(service):
+    app = web.Application(client_max_size=fetcher.MAX_BYTES * 2)
+    app.router.add_post("/score", service.handle_score)
+    app.router.add_get("/metrics", service.handle_metrics)
+    app.router.add_get("/health", service.handle_health)
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+
+# -----------------------------
+# Prueba local (mini_dataset + local_server)
+# -----------------------------
+
+async def selftest(model_keys, requests_per_kind=100):
+    import os
+    import local_server
+
+    pages = [open(os.path.join("mini_dataset", f), encoding="utf-8").read()
+             for f in sorted(os.listdir("mini_dataset")) if f.endswith(".html")]
+    server, base_url = local_server.start_server()
+
+    service = ScoringService(model_keys)
+    runner = web.AppRunner(create_app(service))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    endpoint = f"http://127.0.0.1:{port}/score"
+
+    async with aiohttp.ClientSession() as client:
+        async def post(payload):
+            async with client.post(endpoint, json=payload) as response:
+                return response.status, await response.json(content_type=None)
+
+        payloads = [{"html": pages[i % len(pages)]} for i in range(requests_per_kind)]
+        payloads += [{"url": f"{base_url}/page/{i}"} for i in range(requests_per_kind)]
+        results = await asyncio.gather(*(post(p) for p in payloads))
+
+        # Errores del cliente (400) frente a fallos de descarga (502)
+        bad_bodies = {"invalid JSON": b"{", "JSON list": b"[1, 2]", "non-string url": b'{"url": 1}',
+                      "unreachable url": b'{"url": "http://127.0.0.1:9/"}'}
+        statuses = {}
+        for name, body in bad_bodies.items():
+            async with client.post(endpoint, data=body, headers={"Content-Type": "application/json"}) as response:
+                statuses[name] = response.status
+
+        async with client.get(endpoint.replace("/score", "/metrics")) as response:
+            metrics = await response.json()
+
+    await runner.cleanup()
+    server.shutdown()
+    ok = sum(1 for status, _ in results if status == 200)
+    print(f"{ok}/{len(results)} requests OK")
+    print("error statuses:", statuses)
+    print(metrics)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phishing scoring HTTP service")
+    parser.add_argument("--models", nargs="+", default=["RF"], choices=list(ms.MODEL_NAMES) + [cascade.CASCADE_KEY])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--backend", default="stream", choices=fe.BACKENDS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--selftest", action="store_true")
+    args = parser.parse_args()
+    if cascade.CASCADE_KEY in args.models and cascade.check_cascade():
+        parser.error(cascade.check_cascade())
+
+    if args.selftest:
+        asyncio.run(selftest(args.models))
+    else:
+        service = ScoringService(args.models, args.backend, args.workers, args.max_batch, args.max_wait_ms)
+        web.run_app(create_app(service), host=args.host, port=args.port)
@@ -0,0 +1,280 @@
+# -----------------------------
+# Recolección por shards con checkpoint
+# -----------------------------
+# Sustituye begin_index/end_index: la lista de URLs se reparte en N shards
+# (la URL número i va al shard i % N). Cada shard escribe su propio CSV y
+# su propio checkpoint, así que se puede lanzar en otra máquina y, si
+# falla, se reanuda sólo ese shard. merge_shards() une los CSV al final.
+#
+# Con dedup, cada shard lleva su índice de casi-duplicados
+# (near_duplicates.py): los clones van a <shard>.dups.csv en lugar del CSV y
+# el índice se guarda con cada checkpoint. Los clones entre shards distintos
+# no se detectan (cada shard puede ir en otra máquina).
+#
+#   python sharded_collection.py run   --shards 8             (todos, en local)
+#   python sharded_collection.py shard --index 3 --shards 8   (uno, p.ej. en otra máquina)
+#   python sharded_collection.py merge --shards 8
+
+import os
+import csv
+import json
+import argparse
+from itertools import islice
+from multiprocessing import Process
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import feature_registry as fr
+import data_collector as dc
+import async_collector
+import pipeline
+import url_source
+import near_duplicates as nd
+import feature_cache
+import instrumentation as inst
+from html_archive import ArchiveWriter
+
+
+BATCH_SIZE = 200   # URLs entre checkpoints
+
+
+def shard_name(shard, num_shards):
+    return f"shard-{shard:03d}-of-{num_shards:03d}"
+
+
+def shard_paths(run_dir, shard, num_shards):
+    base = os.path.join(run_dir, shard_name(shard, num_shards))
+    return base + ".csv", base + ".ckpt"
+
+
+def dedup_paths(run_dir, shard, num_shards):
+    # Clones encontrados (URL, original, similitud) e índice de firmas
+    base = os.path.join(run_dir, shard_name(shard, num_shards))
+    return base + ".dups.csv", base + ".dedup"
+
+
+def duplicates_path(output_csv):
+    return os.path.splitext(output_csv)[0] + "_duplicates.csv"
+
+
+def metrics_path(run_dir, shard=None, num_shards=None):
+    # Métricas de un shard, o las de todo el run si shard es None
+    if shard is None:
+        return os.path.join(run_dir, "metrics.json")
+    return os.path.join(run_dir, shard_name(shard, num_shards) + ".metrics.json")
+
+
+def merge_metrics(run_dir, num_shards):
+    for shard in range(num_shards):
+        path = metrics_path(run_dir, shard, num_shards)
+        if os.path.exists(path):
+            inst.merge(inst.load(path))
+
+
+def load_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return {"next_index": 0, "offset": 0, "rows": 0, "dups_offset": 0, "duplicates": 0,
+                "dedup_entries": 0, "done": False}
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint_path, state):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path)
+
+
+def iter_shard(url_list, shard, num_shards, start=0):
+    # url_list puede ser un generador (url_source.iter_urls)
+    for index, url in enumerate(url_list):
+        if index >= start and index % num_shards == shard:
+            yield index, url
+
+
+def iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def collect_batch(urls, engine, backend, archive, executor, writer, workers=None, dedup=None, cache=None):
+    # Escribe las filas del lote en writer y devuelve cuántas son
+    if engine == "pipeline":
+        # Las filas salen hacia writer según se extraen, sin acumularse
+        rows, result = pipeline.run(urls, writer, backend, executor=executor, extract_workers=workers,
+                                    max_bytes=dc.max_page_bytes, archive=archive, dedup=dedup, cache=cache)
+        return rows
+    if engine == "async":
+        rows = async_collector.create_structured_data(urls, backend=backend, archive=archive, executor=executor,
+                                                      max_bytes=dc.max_page_bytes, dedup=dedup, cache=cache)
+    else:
+        rows = dc.create_structured_data(urls, backend=backend, archive=archive, dedup=dedup, cache=cache)
+    writer.writerows(rows)
+    return len(rows)
+
+
+def open_dedup(run_dir, shard, num_shards, state):
+    # Índice y CSV de clones del shard, reanudados desde el checkpoint
+    dups_csv, index_path = dedup_paths(run_dir, shard, num_shards)
+    dups_offset = state.get("dups_offset", 0)
+    if dups_offset > 0 and state.get("dedup_entries"):
+        os.truncate(dups_csv, dups_offset)
+        index = nd.NearDuplicateIndex.load(index_path, state["dedup_entries"])
+    else:
+        state["dedup_entries"] = 0
+        with open(dups_csv, "w", newline="", encoding="utf-8") as out:
+            csv.writer(out).writerow(["URL", "original_url", "similarity"])
+        index = nd.NearDuplicateIndex()
+    return index, dups_csv, index_path
+
+
+def run_shard(url_list, shard, num_shards, run_dir, engine=dc.collector_engine,
+              backend=dc.parser_backend, archive_dir=dc.archive_dir, batch_size=BATCH_SIZE,
+              workers=None, dedup=dc.near_duplicates, cache_path=dc.feature_cache_path):
+    os.makedirs(run_dir, exist_ok=True)
+    output_csv, checkpoint_path = shard_paths(run_dir, shard, num_shards)
+    state = load_checkpoint(checkpoint_path)
+    if state["done"]:
+        print(shard_name(shard, num_shards), "already done")
+        return state
+
+    # Descarta filas escritas después del último checkpoint
+    if state["offset"] > 0:
+        os.truncate(output_csv, state["offset"])
+    else:
+        with open(output_csv, "w", newline="", encoding="utf-8") as out:
+            csv.writer(out).writerow(fr.FEATURE_NAMES + ["URL"])
+
+    archive = None
+    if archive_dir:
+        archive = ArchiveWriter(os.path.join(archive_dir, shard_name(shard, num_shards)))
+
+    index = None
+    if dedup:
+        index, dups_csv, index_path = open_dedup(run_dir, shard, num_shards, state)
+
+    # Todos los shards comparten la misma caché (SQLite admite varios procesos)
+    cache = feature_cache.FeatureCache(cache_path) if cache_path else None
+    executor = ProcessPoolExecutor(workers) if engine in ("async", "pipeline") else None
+    try:
+        with open(output_csv, "a", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out)
+            for batch in iter_batches(iter_shard(url_list, shard, num_shards, state["next_index"]), batch_size):
+                rows = collect_batch([url for _, url in batch], engine, backend, archive, executor, writer,
+                                     workers, index, cache)
+                out.flush()
+                os.fsync(out.fileno())
+                if archive is not None:
+                    archive.commit()
+                if index is not None:
+                    duplicates = index.drain()
+                    with open(dups_csv, "a", newline="", encoding="utf-8") as dups_out:
+                        csv.writer(dups_out).writerows(duplicates)
+                        dups_out.flush()
+                        os.fsync(dups_out.fileno())
+                        state["dups_offset"] = os.fstat(dups_out.fileno()).st_size
+                    # Sólo las firmas nuevas del lote: el índice entero crece con el shard
+                    state["dedup_entries"] = index.save(index_path, state.get("dedup_entries", 0))
+                    state["duplicates"] = state.get("duplicates", 0) + len(duplicates)
+                state["next_index"] = batch[-1][0] + 1
+                state["offset"] = os.fstat(out.fileno()).st_size
+                state["rows"] += rows
+                save_checkpoint(checkpoint_path, state)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if archive is not None:
+            archive.close()
+        if cache is not None:
+            cache.close()
+
+    state["done"] = True
+    save_checkpoint(checkpoint_path, state)
+    if inst.ENABLED:
+        # Se vacía tras escribir: cada fichero cuenta sólo su shard
+        inst.export(metrics_path(run_dir, shard, num_shards))
+        inst.REGISTRY.drain()
+    print(shard_name(shard, num_shards), "done:", state["rows"], "rows,", state.get("duplicates", 0), "near-duplicates")
+    return state
+
+
+def run_shard_from_file(url_filename, shard, num_shards, run_dir, url_limit=None, workers=None):
+    # Cada shard lee la lista en streaming; el orden (y por tanto el
+    # reparto) es el mismo en todos los procesos y máquinas
+    url_list = islice(url_source.iter_urls(url_filename, dc.dedup_hosts), url_limit)
+    return run_shard(url_list, shard, num_shards, run_dir, workers=workers)
+
+
+def run_local(url_filename, num_shards, run_dir, url_limit=None):
+    # Un proceso por shard; los shards terminados se saltan
+    workers = max(1, (os.cpu_count() or 1) // num_shards)
+    processes = {}
+    for shard in range(num_shards):
+        _, checkpoint_path = shard_paths(run_dir, shard, num_shards)
+        if load_checkpoint(checkpoint_path)["done"]:
+            continue
+        process = Process(target=run_shard_from_file, args=(url_filename, shard, num_shards, run_dir, url_limit, workers))
+        process.start()
+        processes[shard] = process
+
+    failed = []
+    for shard, process in processes.items():
+        process.join()
+        if process.exitcode != 0:
+            failed.append(shard)
+    if failed:
+        print("⚠️ Failed shards (run again to resume them):", failed)
+    return failed
+
+
+def merge_shards(run_dir, num_shards, output_csv, label):
+    frames = []
+    for shard in range(num_shards):
+        shard_csv, checkpoint_path = shard_paths(run_dir, shard, num_shards)
+        if not load_checkpoint(checkpoint_path)["done"]:
+            raise RuntimeError(f"{shard_name(shard, num_shards)} is not finished")
+        frames.append(pd.read_csv(shard_csv))
+
+    df_out = pd.concat(frames, ignore_index=True)
+    fr.check_columns(df_out.columns)
+    df_out["label"] = label
+    df_out.to_csv(output_csv, index=False)
+
+    # Referencias de los clones saltados, junto al CSV de salida
+    duplicates = [pd.read_csv(path) for path in
+                  (dedup_paths(run_dir, shard, num_shards)[0] for shard in range(num_shards))
+                  if os.path.exists(path)]
+    if duplicates:
+        pd.concat(duplicates, ignore_index=True).to_csv(duplicates_path(output_csv), index=False)
+    return df_out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded URL collection")
+    parser.add_argument("command", choices=["run", "shard", "merge"])
+    parser.add_argument("--shards", type=int, default=dc.num_shards)
+    parser.add_argument("--index", type=int, help="shard index for the 'shard' command")
+    parser.add_argument("--urls", default=dc.url_filename)
+    parser.add_argument("--run-dir", default=dc.run_dir)
+    parser.add_argument("--limit", type=int, default=dc.url_limit)
+    parser.add_argument("--output", default=dc.output_csv)
+    parser.add_argument("--label", type=int, default=dc.label)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if not run_local(args.urls, args.shards, args.run_dir, args.limit):
+            merge_shards(args.run_dir, args.shards, args.output, args.label)
+            print(f"✅ {args.output} created successfully")
+    elif args.command == "shard":
+        run_shard_from_file(args.urls, args.index, args.shards, args.run_dir, args.limit)
+    else:
+        merge_shards(args.run_dir, args.shards, args.output, args.label)
+        print(f"✅ {args.output} created successfully")
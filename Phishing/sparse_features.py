@@ -0,0 +1,130 @@
+# -----------------------------
+# Bloque disperso de características con hashing
+# -----------------------------
+# Las 22 características de features.py son recuentos de etiquetas. Este
+# bloque añade señales de contenido:
+#
+#   title:<palabra>    palabras del <title>
+#   body:<palabra>     palabras del texto visible (sin <script>/<style>)
+#   action:<host>      dominio del action de cada <form> ("self" si es relativo)
+#   script:<host>      dominio del src de cada <script> externo
+#   input:<nombre>     atributo name de cada <input>
+#
+# No hay vocabulario: cada token se lleva con crc32 a una de N_FEATURES
+# columnas, así que la memoria es fija aunque el corpus tenga millones de
+# palabras distintas (a cambio de alguna colisión). Los tokens se recogen en
+# la misma pasada que los contadores (feature_engine.py, backends soup y
+# stream) con un HashedTokens:
+#
+#   tokens = HashedTokens()
+#   vector = fe.create_vector(body, backend, tokens=tokens)
+#   row = tokens.row()
+#
+# El bloque de un CSV se guarda junto a él (block_path) como matriz CSR con
+# las URLs de cada fila; machine_learning.py --hashed lo usa para entrenar
+# los modelos que aceptan matrices dispersas (SPARSE_MODELS).
+
+import os
+import re
+import json
+import zlib
+from urllib.parse import urlsplit
+import numpy as np
+
+
+N_FEATURES = 2 ** 16
+NAMESPACES = ("title", "body", "action", "script", "input")
+MAX_TOKEN = 40                      # palabras más largas (base64, hashes) se ignoran
+WORD = re.compile(r"\w\w+")
+
+
+def host_of(url):
+    # Dominio de una URL de atributo; "self" si es relativa o está vacía
+    try:
+        host = urlsplit((url or "").strip()).hostname
+    except ValueError:
+        return "invalid"
+    return host or "self"
+
+
+class HashedTokens:
+
+    def __init__(self, n_features=N_FEATURES):
+        self.n_features = n_features
+        self.counts = {}   # columna -> veces
+
+    def add(self, namespace, token):
+        index = zlib.crc32(f"{namespace}:{token}".encode("utf-8")) % self.n_features
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def add_text(self, namespace, text):
+        for word in WORD.findall(text.lower()):
+            if len(word) <= MAX_TOKEN:
+                self.add(namespace, word)
+
+    def add_tag(self, name, attrs):
+        # attrs: cualquier objeto con .get() (dict de atributos del tag)
+        if name == "form":
+            self.add("action", host_of(attrs.get("action")))
+        elif name == "script":
+            if attrs.get("src"):
+                self.add("script", host_of(attrs.get("src")))
+        elif name == "input":
+            if attrs.get("name"):
+                self.add("input", attrs.get("name").strip().lower())
+
+    def row(self):
+        # (columnas ordenadas, valores): una fila CSR
+        indices = np.array(sorted(self.counts), dtype=np.int32)
+        values = np.array([self.counts[i] for i in indices.tolist()], dtype=np.float32)
+        return indices, values
+
+
+def to_matrix(rows, n_features=N_FEATURES):
+    # scipy sólo se importa al montar matrices, no al extraer
+    from scipy import sparse
+
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(indices) for indices, _ in rows])
+    indices = np.concatenate([indices for indices, _ in rows]) if rows else np.empty(0, dtype=np.int32)
+    values = np.concatenate([values for _, values in rows]) if rows else np.empty(0, dtype=np.float32)
+    return sparse.csr_matrix((values, indices, indptr), shape=(len(rows), n_features))
+
+
+# ----- Bloques guardados junto a los CSV ----- #
+def block_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".hashed.npz"
+
+
+def save_block(path, urls, rows, n_features=N_FEATURES):
+    matrix = to_matrix(rows, n_features)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                 shape=np.array(matrix.shape), urls=np.array(json.dumps(list(urls))))
+    os.replace(tmp_path, path)
+    return matrix
+
+
+def load_block(path):
+    from scipy import sparse
+
+    with np.load(path, allow_pickle=False) as data:
+        matrix = sparse.csr_matrix((data["data"], data["indices"], data["indptr"]),
+                                   shape=tuple(data["shape"]))
+        urls = json.loads(str(data["urls"]))
+    return urls, matrix
+
+
+def align(urls, matrix, wanted):
+    # Filas del bloque en el orden de wanted (URLs de un DataFrame); las URLs
+    # que no están en el bloque quedan como filas vacías
+    from scipy import sparse
+
+    position = {url: i for i, url in enumerate(urls)}
+    rows = np.array([position.get(url, -1) for url in wanted], dtype=np.int64)
+    found = rows >= 0
+    selector = sparse.csr_matrix((np.ones(found.sum(), dtype=matrix.dtype),
+                                  (np.flatnonzero(found), rows[found])),
+                                 shape=(len(rows), matrix.shape[0]))
+    return (selector @ matrix).tocsr(), int(found.sum())
@@ -0,0 +1,198 @@
+# -----------------------------
+# Predictor compilado para los modelos de árboles
+# -----------------------------
+# Con una sola fila, predict de DecisionTree, RandomForest (60 árboles) o
+# AdaBoost gasta mucho más en validaciones de sklearn que en recorrer los
+# árboles. export() aplana los árboles entrenados en arrays:
+#
+#   feature, threshold, left, right, missing_left   uno por nodo (todos los
+#                                                    árboles concatenados)
+#   value                                            valores de cada nodo
+#   roots                                            nodo raíz de cada árbol
+#
+# TreePredictor los recorre con numpy (todas las filas y todos los árboles a
+# la vez, un nivel por iteración) y reproduce las mismas operaciones que
+# sklearn para dar exactamente las mismas predicciones. No importa sklearn.
+# Con lotes de miles de filas de un bosque profundo el código C de sklearn
+# vuelve a ser más rápido; para una fila o lotes pequeños gana este.
+#
+#   python tree_predictor.py [DT RF AB]    compila y comprueba la paridad
+
+import sys
+import numpy as np
+
+
+SUFFIX = ".trees.npz"
+KINDS = {
+    "DecisionTreeClassifier": "tree",
+    "RandomForestClassifier": "forest",
+    "AdaBoostClassifier": "boost",
+}
+
+
+def supports(model):
+    return type(model).__name__ in KINDS
+
+
+# ----- Exportar (necesita el modelo de sklearn) ----- #
+def flatten_trees(estimators):
+    # Las hojas apuntan a sí mismas (left == right == nodo): así se reconocen
+    # sin consultar otro array
+    arrays = {name: [] for name in ("feature", "threshold", "left", "right", "missing_left", "value")}
+    roots, offset = [], 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        n = tree.node_count
+        nodes = np.arange(n)
+        leaf = tree.children_left == -1
+        arrays["feature"].append(np.where(leaf, 0, tree.feature))
+        arrays["threshold"].append(tree.threshold)
+        arrays["left"].append(np.where(leaf, nodes, tree.children_left) + offset)
+        arrays["right"].append(np.where(leaf, nodes, tree.children_right) + offset)
+        arrays["missing_left"].append(tree.missing_go_to_left.astype(bool))
+        arrays["value"].append(tree.value[:, 0, :])
+        roots.append(offset)
+        offset += n
+    return {
+        "feature": np.concatenate(arrays["feature"]).astype(np.int32),
+        "threshold": np.concatenate(arrays["threshold"]).astype(np.float64),
+        "left": np.concatenate(arrays["left"]).astype(np.int32),
+        "right": np.concatenate(arrays["right"]).astype(np.int32),
+        "missing_left": np.concatenate(arrays["missing_left"]),
+        "value": np.concatenate(arrays["value"]).astype(np.float64),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+
+
+def export_arrays(model):
+    name = type(model).__name__
+    if name not in KINDS:
+        raise ValueError(f"Cannot compile {name}: only {', '.join(KINDS)}")
+    kind = KINDS[name]
+    estimators = [model] if kind == "tree" else list(model.estimators_)
+    arrays = flatten_trees(estimators)
+    arrays["kind"] = np.array(kind)
+    arrays["classes"] = np.asarray(model.classes_)
+    if kind == "boost":
+        if len(model.classes_) != 2:
+            raise ValueError("Only binary AdaBoost models can be compiled")
+        arrays["weights"] = np.asarray(model.estimator_weights_[:len(estimators)], dtype=np.float64)
+        arrays["weight_sum"] = np.array(model.estimator_weights_.sum())
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        arrays["feature_names"] = np.array([str(n) for n in names])
+    return arrays
+
+
+def export(model, path):
+    np.savez(path, **export_arrays(model))
+    return path
+
+
+# ----- Predecir (sólo numpy) ----- #
+class TreePredictor:
+
+    def __init__(self, arrays):
+        self.kind = str(arrays["kind"])
+        self.classes_ = arrays["classes"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.missing_left = arrays["missing_left"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.children = np.column_stack([self.left, self.right]).ravel()
+        self.is_leaf = self.left == np.arange(len(self.left))
+        if "feature_names" in arrays:
+            self.feature_names_in_ = np.array([str(n) for n in arrays["feature_names"]], dtype=object)
+        if self.kind == "boost":
+            self.weights = arrays["weights"]
+            self.weight_sum = float(arrays["weight_sum"])
+            self.leaf_class = np.argmax(self.value, axis=1)
+
+    def _matrix(self, X):
+        # Como sklearn: float32, en el orden de columnas del entrenamiento
+        if hasattr(X, "columns") and hasattr(self, "feature_names_in_"):
+            if list(X.columns) != list(self.feature_names_in_):
+                X = X[list(self.feature_names_in_)]
+            X = X.to_numpy()
+        X = np.asarray(X, dtype=np.float32)
+        return X.reshape(1, -1) if X.ndim == 1 else X
+
+    def apply(self, X):
+        # Hoja de cada (fila, árbol). Cada iteración baja un nivel y sólo
+        # sigue con los pares que aún no han llegado a una hoja
+        X = self._matrix(X)
+        n_rows, n_trees = X.shape[0], len(self.roots)
+        flat = X.ravel()
+        nodes = np.tile(self.roots, n_rows)
+        offsets = np.repeat(np.arange(n_rows) * X.shape[1], n_trees)
+        has_nan = np.isnan(flat).any()
+        active = np.flatnonzero(~self.is_leaf.take(nodes))
+        while active.size:
+            current = nodes.take(active)
+            x = flat.take(offsets.take(active) + self.feature.take(current))
+            go_left = x <= self.threshold.take(current)
+            if has_nan:
+                go_left = np.where(np.isnan(x), self.missing_left.take(current), go_left)
+            # children[2 * nodo] es el hijo izquierdo y children[2 * nodo + 1] el derecho
+            current = self.children.take(2 * current + 1 - go_left)
+            nodes[active] = current
+            active = active[~self.is_leaf.take(current)]
+        return nodes.reshape(n_rows, n_trees)
+
+    def _forest_proba(self, leaves):
+        # sklearn suma los árboles uno a uno desde cero: mismo orden aquí
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]))
+        for t in range(leaves.shape[1]):
+            proba += self.value[leaves[:, t]]
+        return proba / len(self.roots)
+
+    def decision_function(self, X):
+        # AdaBoost binario (SAMME), mismas operaciones que sklearn
+        leaves = self.apply(X)
+        votes = np.where(self.leaf_class[leaves] == 1, self.weights, -self.weights)
+        positive = np.cumsum(votes, axis=1)[:, -1] / self.weight_sum
+        return positive + positive
+
+    def predict_proba(self, X):
+        if self.kind == "boost":
+            decision = self.decision_function(X)
+            scores = np.vstack([-decision, decision]).T / 2
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return scores / scores.sum(axis=1, keepdims=True)
+        leaves = self.apply(X)
+        if self.kind == "tree":
+            return self.value[leaves[:, 0]]
+        return self._forest_proba(leaves)
+
+    def predict(self, X):
+        if self.kind == "boost":
+            return self.classes_.take(self.decision_function(X) > 0, axis=0)
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def load(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        return TreePredictor({name: arrays[name] for name in arrays.files})
+
+
+def check_parity(model, predictor, X):
+    # Devuelve el número de filas en las que difieren las predicciones
+    return int(np.sum(model.predict(X) != predictor.predict(X)))
+
+
+if __name__ == "__main__":
+    # Compila la última versión de DT, RF y AB (o las claves indicadas) y
+    # comprueba que predicen igual que sklearn sobre los datasets
+    import model_store as ms
+    from datasets import load_datasets, prepare_data
+
+    legitimate_df, phishing_df = load_datasets(urls=False)
+    _, X, _ = prepare_data(legitimate_df, phishing_df)
+    for key in sys.argv[1:] or ["DT", "RF", "AB"]:
+        model, metadata = ms.load_model(key)
+        path = ms.compiled_path(key, metadata["version"])
+        predictor = load(export(model, path))
+        print(f"{key} v{metadata['version']} -> {path}: {check_parity(model, predictor, X)} mismatches")
@@ -0,0 +1,84 @@
+# -----------------------------
+# Lectura en streaming de listas de URLs
+# -----------------------------
+# Lee el fichero por bloques (pd.read_csv con chunksize), normaliza cada
+# URL sólo cuando se consume y descarta los hosts repetidos con un filtro
+# de Bloom: memoria constante aunque la lista tenga millones de filas, y la
+# primera URL sale en cuanto se lee el primer bloque.
+
+import csv
+import math
+import hashlib
+from urllib.parse import urlsplit
+import pandas as pd
+
+
+CHUNK_ROWS = 100_000
+BLOOM_CAPACITY = 2_000_000
+BLOOM_ERROR_RATE = 0.001
+
+
+def normalize_url(url):
+    if url.startswith("http://") or url.startswith("https://"):
+        return url
+    return "http://" + url
+
+
+def url_host(url):
+    return (urlsplit(url).hostname or "").lower()
+
+
+class BloomFilter:
+    # Conjunto probabilístico: sin falsos negativos y con una tasa de
+    # falsos positivos ~error_rate mientras no se supere capacity
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        # Devuelve True si el elemento no estaba (probablemente) ya
+        new = False
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+    def __contains__(self, item):
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(item))
+
+
+def detect_url_column(url_filename):
+    # PhishTank (verified_online.csv) tiene cabecera con columna "url";
+    # Tranco (top-1m.csv) no tiene cabecera y el dominio va en la columna 1
+    with open(url_filename, "r", encoding="utf-8", newline="") as f:
+        first_row = next(csv.reader(f), [])
+    if "url" in first_row:
+        return {"usecols": ["url"]}
+    return {"header": None, "usecols": [1]}
+
+
+def iter_raw_urls(url_filename, chunk_rows=CHUNK_ROWS):
+    options = detect_url_column(url_filename)
+    for chunk in pd.read_csv(url_filename, chunksize=chunk_rows, dtype=str, **options):
+        for url in chunk.iloc[:, 0].dropna():
+            yield url
+
+
+def iter_urls(url_filename, dedup_hosts=True, chunk_rows=CHUNK_ROWS,
+              capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+    seen = BloomFilter(capacity, error_rate) if dedup_hosts else None
+    for url in iter_raw_urls(url_filename, chunk_rows):
+        url = normalize_url(url.strip())
+        if seen is not None and not seen.add(url_host(url)):
+            continue
+        yield url
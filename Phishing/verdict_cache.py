@@ -0,0 +1,137 @@
+# -----------------------------
+# Caché de veredictos (LRU + TTL) en dos niveles
+# -----------------------------
+# Pulsar Check! dos veces sobre la misma URL descargaba, parseaba y puntuaba
+# la página dos veces. Aquí:
+#
+#   nivel 1:  URL -> hash del contenido descargado la última vez
+#             (TTL corto: pasado ese tiempo se vuelve a descargar)
+#   nivel 2:  (hash del contenido, versión del modelo) -> veredicto
+#             (TTL largo: el mismo HTML con el mismo modelo da lo mismo)
+#
+# - repetir una URL dentro de URL_TTL no descarga nada
+# - una página distinta con el mismo HTML (kits de phishing clonados) se
+#   descarga pero no se parsea ni se puntúa
+# - si la página cambia, su hash cambia y se vuelve a puntuar
+#
+# Ambos niveles tienen tamaño máximo y expulsan la entrada menos usada.
+
+import time
+import threading
+import hashlib
+from collections import OrderedDict, namedtuple
+import feature_registry as fr
+
+
+URL_ENTRIES = 10_000
+VERDICT_ENTRIES = 50_000
+URL_TTL = 5 * 60            # segundos
+VERDICT_TTL = 24 * 60 * 60
+
+Verdict = namedtuple("Verdict", ["prediction", "truncated"])
+
+
+def content_hash(body):
+    # Clave de contenido común a html_archive.py, feature_cache.py y esta caché
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+def model_version(metadata):
+    # Identifica el modelo y el esquema con el que se extraen sus características
+    return f"{metadata['key']}:v{metadata['version']}:{fr.schema_fingerprint(metadata['features'])}"
+
+
+class LRUCache:
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()   # clave -> (valor, caduca_en)
+        # Compartida entre sesiones de Streamlit (st.cache_resource): get y
+        # put reordenan el OrderedDict
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if self.clock() >= expires_at:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, self.clock() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "expirations": self.expirations}
+
+
+class VerdictCache:
+
+    def __init__(self, url_entries=URL_ENTRIES, verdict_entries=VERDICT_ENTRIES,
+                 url_ttl=URL_TTL, verdict_ttl=VERDICT_TTL, clock=time.monotonic):
+        self.urls = LRUCache(url_entries, url_ttl, clock)
+        self.verdicts = LRUCache(verdict_entries, verdict_ttl, clock)
+
+    def lookup_url(self, url, version):
+        # Nivel 1 + 2: veredicto sin descargar, o None
+        digest = self.urls.get(url)
+        if digest is None:
+            return None
+        return self.verdicts.get((digest, version))
+
+    def lookup_content(self, url, digest, version):
+        # Ya descargada: se apunta el hash de la URL aunque no haya veredicto
+        self.urls.put(url, digest)
+        return self.verdicts.get((digest, version))
+
+    def store(self, url, digest, version, verdict):
+        self.urls.put(url, digest)
+        self.verdicts.put((digest, version), verdict)
+
+    def stats(self):
+        return {"urls": self.urls.stats(), "verdicts": self.verdicts.stats()}
+
+
+if __name__ == "__main__":
+    now = [0.0]
+    cache = VerdictCache(url_entries=2, verdict_entries=2, url_ttl=10, verdict_ttl=100,
+                         clock=lambda: now[0])
+    v = "RF:v1:x"
+    a, b = content_hash("<html>a</html>"), content_hash("<html>b</html>")
+    cache.store("http://a", a, v, Verdict(1, False))
+    assert cache.lookup_url("http://a", v) == Verdict(1, False)
+    assert cache.lookup_url("http://a", "RF:v2:x") is None          # otro modelo
+    assert cache.lookup_content("http://mirror", a, v).prediction == 1  # clon
+    now[0] = 11
+    assert cache.lookup_url("http://a", v) is None                  # URL caducada
+    assert cache.lookup_content("http://a", b, v) is None            # página cambiada
+    cache.store("http://c", b, v, Verdict(0, False))
+    cache.store("http://d", content_hash("d"), v, Verdict(0, False))
+    assert len(cache.verdicts) == 2 and cache.verdicts.evictions == 1
+    print(cache.stats())